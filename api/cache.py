@@ -0,0 +1,227 @@
+# ===============================================================================
+# Copyright 2023 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import os
+import time
+from collections import OrderedDict
+from threading import Event, Lock, Thread
+
+RESULT_CACHE_TTL = float(os.environ.get("NMWDI_RESULT_CACHE_TTL", 3600))
+RESULT_CACHE_SIZE = int(os.environ.get("NMWDI_RESULT_CACHE_SIZE", 32))
+# total bytes of stored payloads, and the largest payload that is stored
+RESULT_CACHE_BYTES = int(os.environ.get("NMWDI_RESULT_CACHE_BYTES", 256 * 2**20))
+RESULT_CACHE_MAX_PAYLOAD = int(
+    os.environ.get("NMWDI_RESULT_CACHE_MAX_PAYLOAD", 64 * 2**20)
+)
+# seconds a coalesced request waits for the next chunk of the payload it is waiting
+# for before producing the payload itself
+FLIGHT_TIMEOUT = float(os.environ.get("NMWDI_RESULT_CACHE_FLIGHT_TIMEOUT", 60))
+
+
+class Flight:
+    """
+    a payload being produced for a cache miss. requests for the same key wait for
+    it instead of producing the payload again
+    """
+
+    def __init__(self):
+        self.done = Event()
+        self.stored = False
+        self.progress = time.time()
+
+    def stalled(self):
+        return time.time() - self.progress > FLIGHT_TIMEOUT
+
+
+class ResultCache:
+    """
+    in memory cache of streamed endpoint payloads with stale-while-revalidate.
+
+    a miss streams the payload to the client while keeping a copy of the chunks,
+    which is stored once the stream completes. concurrent misses on the same key
+    wait for that stream instead of producing the payload again. a hit replays the
+    stored chunks. once an entry is older than ttl seconds it is still served but
+    refreshed in a background thread, one refresh per key at a time.
+
+    payloads larger than max_payload bytes are streamed but not stored. at most
+    max_entries payloads and max_bytes bytes are kept, least recently used are
+    evicted
+    """
+
+    def __init__(
+        self,
+        ttl=RESULT_CACHE_TTL,
+        max_entries=RESULT_CACHE_SIZE,
+        max_bytes=RESULT_CACHE_BYTES,
+        max_payload=RESULT_CACHE_MAX_PAYLOAD,
+    ):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_payload = min(max_payload, max_bytes)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.uncached = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+
+        self._entries = OrderedDict()
+        self._nbytes = 0
+        self._flights = {}
+        self._refreshing = set()
+        self._lock = Lock()
+
+    def stream(self, key, produce):
+        """
+        returns an iterator of the payload chunks for key. produce() returns an
+        iterator of the chunks and is only called on a miss or to refresh
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                flight = self._flights.get(key)
+                if flight is None:
+                    self.misses += 1
+                    flight = self._flights[key] = Flight()
+                    return self._tee(key, produce, flight)
+
+                self.coalesced += 1
+                return self._follow(key, produce, flight)
+
+            self._entries.move_to_end(key)
+            chunks, nbytes, stored = entry
+            if time.time() - stored > self.ttl:
+                self.stale_hits += 1
+                self._refresh(key, produce)
+            else:
+                self.hits += 1
+        return iter(chunks)
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "uncached": self.uncached,
+            "refreshes": self.refreshes,
+            "refresh_errors": self.refresh_errors,
+            "entries": len(self._entries),
+            "bytes": self._nbytes,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def _tee(self, key, produce, flight):
+        chunks = []
+        nbytes = 0
+        try:
+            for chunk in produce():
+                if chunks is not None:
+                    nbytes += len(chunk)
+                    if nbytes > self.max_payload:
+                        # too large to store. stop keeping a copy
+                        chunks = None
+                        self.uncached += 1
+                    else:
+                        chunks.append(chunk)
+                flight.progress = time.time()
+                yield chunk
+
+            # only complete payloads are stored. a client disconnecting closes
+            # this generator before we get here
+            if chunks is not None:
+                self._store(key, chunks, nbytes)
+                flight.stored = True
+        finally:
+            self._land(key, flight)
+
+    def _land(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.done.set()
+
+    def _follow(self, key, produce, flight):
+        # runs in the response's worker thread so blocking here is fine. a flight
+        # whose stream was never started, e.g. the client went away before the
+        # response began, or that stopped making progress is abandoned
+        while not flight.done.wait(1):
+            if flight.stalled():
+                self._land(key, flight)
+                break
+
+        if flight.stored:
+            yield from self.stream(key, produce)
+        else:
+            # the payload was not stored, e.g. it was too large. produce it rather
+            # than queueing behind another miss
+            yield from produce()
+
+    def _store(self, key, chunks, nbytes):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._nbytes -= old[1]
+
+            self._entries[key] = (chunks, nbytes, time.time())
+            self._nbytes += nbytes
+            while (
+                len(self._entries) > self.max_entries or self._nbytes > self.max_bytes
+            ):
+                _, (_, n, _) = self._entries.popitem(last=False)
+                self._nbytes -= n
+
+    def _refresh(self, key, produce):
+        # called with the lock held
+        if key in self._refreshing:
+            return
+        self._refreshing.add(key)
+
+        def run():
+            try:
+                chunks = []
+                nbytes = 0
+                for chunk in produce():
+                    nbytes += len(chunk)
+                    if nbytes > self.max_payload:
+                        # no longer small enough to keep
+                        with self._lock:
+                            entry = self._entries.pop(key, None)
+                            if entry is not None:
+                                self._nbytes -= entry[1]
+                        self.uncached += 1
+                        return
+                    chunks.append(chunk)
+
+                self._store(key, chunks, nbytes)
+                self.refreshes += 1
+            except Exception as e:
+                # keep serving the stale payload
+                self.refresh_errors += 1
+                print(f"failed refreshing {key}. {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        Thread(target=run, daemon=True).start()
+
+
+# ============= EOF =============================================
@@ -14,7 +14,7 @@
 # limitations under the License.
 # ===============================================================================
 
-import requests
+from datatool.session import get_session
 from shapely import Polygon, box
 
 
@@ -29,7 +29,7 @@ def statelookup(shortname):
     # with open(p, "r") as rfile:
     #     obj = json.load(rfile)
     url = f"https://reference.geoconnex.us/collections/states/items?f=json"
-    resp = requests.get(url)
+    resp = get_session().get(url)
     obj = resp.json()
 
     shortname = shortname.lower()
@@ -56,7 +56,7 @@ def get_state_polygon(state):
         url = (
             f"https://reference.geoconnex.us/collections/states/items/{statefp}?&f=json"
         )
-        resp = requests.get(url)
+        resp = get_session().get(url)
         obj = resp.json()
 
         return Polygon(obj["geometry"]["coordinates"][0][0])
@@ -69,7 +69,7 @@ def get_state_bb(state):
 
 def get_huc_polygon(level, huc):
     url = f"https://geoconnex.us/ref/hu{level:02n}/{huc}?f=json"
-    resp = requests.get(url)
+    resp = get_session().get(url)
     obj = resp.json()
     return Polygon(obj["geometry"]["coordinates"][0][0])
 
@@ -95,7 +95,7 @@ def get_county_polygon(name):
         # with open(p, "r") as rfile:
         #     obj = json.load(rfile)
         url = f"https://reference.geoconnex.us/collections/counties/items?STATEFP={statefp}&f=json"
-        resp = requests.get(url)
+        resp = get_session().get(url)
         obj = resp.json()
 
         county = county.lower()
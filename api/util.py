@@ -17,31 +17,50 @@ import csv
 import io
 import json
 import os
+import zipfile
+from functools import cached_property, lru_cache
 
 import geopandas
-import requests
 import shapely
 from shapely import affinity
 from shapely.geometry import Polygon
 
-from sta.client import Client
+from datatool.paging import get_entities
+from datatool.session import get_session, make_client
+from datatool.util import ordered_map
 
 from geoconnex import get_huc_polygon, get_county_polygon
 
 NM_AQUIFER_SITEMETADATA = None
 
+# locations excluded from /mrg_waterlevels
+WATERLEVELS_SKIP = (
+    "LALF10",
+    "LALF11",
+    "LALF12",
+    "LALF13",
+    "LALF14",
+    "LALF15",
+    "LALF18",
+    "IW4",
+)
+# number of locations whose water levels are fetched concurrently
+WATERLEVELS_WORKERS = int(os.environ.get("NMWDI_WATERLEVELS_WORKERS", 8))
+# buffered/simplified boundary variants kept by get_boundary
+BOUNDARY_CACHE_SIZE = 64
+
 
 def get_nm_aquifer_sitemetadata(pointid, objectid=None):
     global NM_AQUIFER_SITEMETADATA
     recurse = True
     if NM_AQUIFER_SITEMETADATA is None:
         url = "https://maps.nmt.edu/maps/data/waterlevels/sitemetadata"
-        resp = requests.get(url)
+        resp = get_session().get(url)
         NM_AQUIFER_SITEMETADATA = resp.json()
     else:
         if objectid:
             url = "https://maps.nmt.edu/maps/data/waterlevels/sitemetadata"
-            resp = requests.get(url, params=dict(objectid=objectid))
+            resp = get_session().get(url, params=dict(objectid=objectid))
             locs = resp.json()
             recurse = len(locs) > 1
             NM_AQUIFER_SITEMETADATA.extend(resp.json())
@@ -57,16 +76,18 @@ def get_nm_aquifer_sitemetadata(pointid, objectid=None):
         return site
 
 
-def get_mrg_boundary_gdf(simplify=0.05, buf=0.25):
-    name = "RegiionalABQ_Socorro_1km_BOUND"
-    poly = get_shp_polygon(name)
+MRG_BOUNDARY = "RegiionalABQ_Socorro_1km_BOUND"
 
-    poly = poly.buffer(buf)
-    poly = poly.simplify(simplify)
 
+def get_mrg_boundary_gdf(simplify=0.05, buf=0.25):
+    poly = get_boundary(MRG_BOUNDARY, buf, simplify).polygon
     return geopandas.GeoDataFrame(geometry=[poly])
 
 
+def get_mrg_boundary_geojson(simplify=0.05, buf=0.25):
+    return get_boundary(MRG_BOUNDARY, buf, simplify).geojson
+
+
 def get_mrg_locations(sim, buf, *args, **kw):
     if "expand" not in kw:
         kw["expand"] = "Things/Datastreams"
@@ -74,7 +95,7 @@ def get_mrg_locations(sim, buf, *args, **kw):
         kw["pages"] = 100
 
     # f = make_huc_filter(8, '13020203')
-    f = make_shp_filter("RegiionalABQ_Socorro_1km_BOUND", buf, tolerance=sim)
+    f = make_shp_filter(MRG_BOUNDARY, buf, tolerance=sim)
 
     locations = _get_locations(query=f, *args, **kw)
     return [
@@ -90,31 +111,109 @@ def get_mrg_locations(sim, buf, *args, **kw):
 
 
 def get_mrg_waterlevels_csv(sim, buf, *args, **kw):
+    """
+    returns [(name, rows), ...] for the Middle Rio Grande locations with water
+    levels
+    """
+    return list(iter_mrg_waterlevels(sim, buf, *args, **kw))
+
+
+def iter_mrg_waterlevels(sim, buf, *args, workers=None, **kw):
+    """
+    yield (name, rows) for each Middle Rio Grande location with water levels as
+    soon as its observations arrive. up to `workers` locations are fetched
+    concurrently and the results are kept in location order
+    """
+    if workers is None:
+        workers = WATERLEVELS_WORKERS
+
     clt = make_clt()
-    csvs = []
-    for loc in get_mrg_locations(sim, buf, expand="Things/Datastreams"):
-        name = loc["name"]
-        if name in (
-            "LALF10",
-            "LALF11",
-            "LALF12",
-            "LALF13",
-            "LALF14",
-            "LALF15",
-            "LALF18",
-            "IW4",
-        ):
-            continue
+    locations = (
+        loc
+        for loc in get_mrg_locations(sim, buf, expand="Things/Datastreams")
+        if loc["name"] not in WATERLEVELS_SKIP
+    )
+
+    def get_waterlevels(loc):
+        print(f"getting water levels for {loc['name']}")
+        return loc["name"], _get_waterlevels_csv(clt, loc)
 
-        print(f"getting water levels for {name}")
-        lc = _get_waterlevels_csv(clt, loc)
+    for name, lc in ordered_map(get_waterlevels, locations, workers):
         if lc:
-            csvs.append((name, lc))
+            yield name, lc
         else:
             print(f"       no water levels for {name}")
 
     print("go all waterlevels")
-    return csvs
+
+
+def iter_mrg_waterlevels_csv(sim, buf, *args, **kw):
+    """
+    yield the combined /mrg_waterlevels CSV one location at a time. the header is
+    written once with a leading location column
+    """
+    header = False
+    for name, rows in iter_mrg_waterlevels(sim, buf, *args, **kw):
+        output = io.StringIO()
+        writer = csv.writer(output)
+        if not header:
+            writer.writerow(["location"] + rows[0])
+            header = True
+
+        for row in rows[1:]:
+            writer.writerow([name] + row)
+        yield output.getvalue()
+
+
+def iter_mrg_waterlevels_zip(sim, buf, *args, **kw):
+    """
+    yield a zip archive with a {name}.csv entry per location, one entry at a time
+    """
+    yield from stream_zip(
+        (f"{name}.csv", rows)
+        for name, rows in iter_mrg_waterlevels(sim, buf, *args, **kw)
+    )
+
+
+class ZipChunkSink(io.RawIOBase):
+    """
+    unseekable file object that collects what zipfile writes so it can be handed
+    out in chunks. because it can not seek, zipfile writes each entry's sizes and
+    crc in a data descriptor after the entry instead of going back to its header
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(entries, compression=zipfile.ZIP_DEFLATED):
+    """
+    yield the bytes of a zip archive of entries, an iterable of (filename, rows).
+    every entry is compressed and yielded as soon as its rows are written so only
+    one entry is held in memory
+    """
+    sink = ZipChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as zf:
+        for filename, rows in entries:
+            with zf.open(filename, "w") as entry:
+                with io.TextIOWrapper(entry, encoding="utf-8", newline="") as wfile:
+                    csv.writer(wfile).writerows(rows)
+            yield sink.drain()
+
+    # central directory
+    yield sink.drain()
 
 
 def _get_waterlevels_csv(clt, loc):
@@ -224,12 +323,14 @@ def _get_locations(within=None, query=None, **kw):
     if filterargs:
         query = " and ".join(filterargs)
 
-    yield from clt.get_locations(query=query, **kw)
+    yield from get_entities(clt, "Locations", query=query, **kw)
 
 
 def make_clt():
-    url = "https://st2.newmexicowaterdata.org/FROST-Server/v1.1"
-    clt = Client(base_url=url)
+    url = os.environ.get(
+        "NMWDI_STA_URL", "https://st2.newmexicowaterdata.org/FROST-Server/v1.1"
+    )
+    clt = make_client(base_url=url)
     return clt
 
 
@@ -426,7 +527,12 @@ def make_huc_filter(level, huc, tolerance=10):
     return make_within(wkt)
 
 
+@lru_cache(maxsize=None)
 def get_shp_polygon(name):
+    """
+    the first polygon of data/{name}/{name}.shp in EPSG:4326. read and reprojected
+    once per name
+    """
     path = f"data/{name}/{name}.shp"
     # sp = shapefile.Reader(f'data/{name}/{name}.shp')
     df = geopandas.read_file(path)
@@ -438,13 +544,35 @@ def get_shp_polygon(name):
     return df.iloc[0].geometry
 
 
-def make_shp_filter(name, buf, tolerance=20):
+class Boundary:
+    """
+    a buffered and simplified polygon with its WKT and GeoJSON, computed on first
+    use
+    """
+
+    def __init__(self, polygon):
+        self.polygon = polygon
+
+    @cached_property
+    def wkt(self):
+        return self.polygon.wkt
+
+    @cached_property
+    def geojson(self):
+        return geopandas.GeoDataFrame(geometry=[self.polygon]).to_json()
+
+
+@lru_cache(maxsize=BOUNDARY_CACHE_SIZE)
+def get_boundary(name, buf, tolerance):
     poly = get_shp_polygon(name)
 
     poly = poly.buffer(buf)
     poly = poly.simplify(tolerance)
+    return Boundary(poly)
 
-    return make_within(poly.wkt)
+
+def make_shp_filter(name, buf, tolerance=20):
+    return make_within(get_boundary(name, buf, tolerance).wkt)
 
 
 def make_wkt(within):
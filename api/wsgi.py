@@ -13,11 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
-import csv
-import io
 import os
-import zipfile
-from io import BytesIO, StringIO
 
 from fastapi import FastAPI, Request
 from fastapi.templating import Jinja2Templates
@@ -29,19 +25,37 @@ from typing import List
 
 from starlette.responses import StreamingResponse
 
-from util import get_mrg_locations_csv, get_mrg_waterlevels_csv, get_mrg_boundary_gdf
+from util import (
+    get_mrg_locations_csv,
+    get_mrg_boundary_geojson,
+    iter_mrg_waterlevels_csv,
+    iter_mrg_waterlevels_zip,
+)
 from response_models import WaterLevel, Location
+from cache import ResultCache
 
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 
+# /mrg_locations and /mrg_waterlevels payloads keyed by (endpoint, simplify, buf,
+# as_zip)
+RESULT_CACHE = ResultCache()
+
+# simplify and buf are rounded to this many decimals before they are used, so
+# clients can't fill the cache with payloads for nearly identical floats
+KEY_DECIMALS = 3
+
+
+def normalize(simplify, buf):
+    return round(simplify, KEY_DECIMALS), round(buf, KEY_DECIMALS)
+
 
 @app.get("/mrg_boundary")
 async def get_mrg_boundary(simplify: float = 0.05, buf: float = 0.25):
-    gdf = get_mrg_boundary_gdf(simplify=simplify, buf=buf)
+    geojson = get_mrg_boundary_geojson(simplify=simplify, buf=buf)
 
     return StreamingResponse(
-        iter([gdf.to_json()]),
+        iter([geojson]),
         media_type="application/json",
         headers={"Content-Disposition": f"attachment; filename=boundary.geojson"},
     )
@@ -49,46 +63,36 @@ async def get_mrg_boundary(simplify: float = 0.05, buf: float = 0.25):
 
 @app.get("/mrg_locations")
 async def get_waterlevels_locations(simplify: float = 0.05, buf: float = 0.25):
+    simplify, buf = normalize(simplify, buf)
+    payload = RESULT_CACHE.stream(
+        ("/mrg_locations", simplify, buf, False),
+        lambda: iter([get_mrg_locations_csv(simplify, buf)]),
+    )
     return StreamingResponse(
-        iter([get_mrg_locations_csv(simplify, buf)]),
+        payload,
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename=mrg_locations.csv"},
     )
 
 
 @app.get("/mrg_waterlevels")
-async def get_waterlevels(simplify: float = 0.05, buf: float = 0.25, as_zip=False):
-    csvs = get_mrg_waterlevels_csv(simplify, buf)
+async def get_waterlevels(
+    simplify: float = 0.05, buf: float = 0.25, as_zip: bool = False
+):
+    simplify, buf = normalize(simplify, buf)
+    # chunks are produced per location while the response is being sent
     if as_zip:
-        zip_io = BytesIO()
-        with zipfile.ZipFile(
-            zip_io, mode="w", compression=zipfile.ZIP_DEFLATED
-        ) as temp_zip:
-            for name, ci in csvs:
-                output = io.StringIO()
-                writer = csv.writer(output)
-                writer.writerows(ci)
-                ci = output.getvalue()
-                temp_zip.writestr(f"{name}.csv", ci)
-        payload = iter([zip_io.getvalue()])
-        media_type = ("application/x-zip-compressed",)
+        produce = iter_mrg_waterlevels_zip
+        media_type = "application/x-zip-compressed"
     else:
-        stringio = StringIO()
-        writer = csv.writer(stringio)
-        for j, (name, rows) in enumerate(csvs):
-            for i, row in enumerate(rows):
-                if i == 0:
-                    if j > 0:
-                        continue
-                    nrow = ["location"] + row
-                else:
-                    nrow = [name] + row
-
-                writer.writerow(nrow)
-
-        payload = iter([stringio.getvalue()])
+        produce = iter_mrg_waterlevels_csv
         media_type = "text/csv"
 
+    payload = RESULT_CACHE.stream(
+        ("/mrg_waterlevels", simplify, buf, as_zip),
+        lambda: produce(simplify, buf),
+    )
+
     return StreamingResponse(
         payload,
         media_type=media_type,
@@ -98,6 +102,11 @@ async def get_waterlevels(simplify: float = 0.05, buf: float = 0.25, as_zip=Fals
     )
 
 
+@app.get("/cache_stats")
+async def get_cache_stats():
+    return RESULT_CACHE.stats()
+
+
 @app.get("/", response_class=HTMLResponse)
 async def root(
     request: Request,
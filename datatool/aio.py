@@ -0,0 +1,346 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+"""
+asyncio fetch engine used by the --async option. requests are bounded by a global
+semaphore and the adaptive per host limit of datatool.throttle, so one process can
+keep hundreds of requests in flight without a thread per request. requires httpx
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from queue import Empty, Full, Queue
+from threading import Event, Thread
+
+import click
+
+from datatool import session, throttle
+from datatool.paging import DEFAULT_PAGE_SIZE, make_page_url
+from datatool.throttle import RETRY_STATUS, backoff_delay, get_controller
+
+DEFAULT_CONCURRENCY = 100
+DEFAULT_PER_HOST = 25
+DEFAULT_TIMEOUT = 120
+
+CONCURRENCY = DEFAULT_CONCURRENCY
+PER_HOST = DEFAULT_PER_HOST
+
+
+def configure_engine(concurrency=None, per_host=None):
+    """
+    set the total and per host number of requests AsyncEngines keep in flight
+    """
+    global CONCURRENCY, PER_HOST
+    if concurrency:
+        CONCURRENCY = concurrency
+    if per_host:
+        PER_HOST = per_host
+
+
+class AsyncEngine:
+    """
+    async SensorThings client. use as an async context manager
+
+        async with AsyncEngine() as engine:
+            async for loc in engine.iter_entities(base_url, "Locations"):
+                ...
+    """
+
+    def __init__(self, concurrency=None, per_host=None, verbose=False, auth=None):
+        self.concurrency = concurrency or CONCURRENCY
+        self.per_host = per_host or PER_HOST
+        self.verbose = verbose
+        # (user, pwd) sent with every request, see datatool.paging.get_auth
+        self.auth = auth
+        self.requests = 0
+
+        self._httpx = None
+        self._client = None
+        self._semaphore = None
+        self._released = None
+
+    async def __aenter__(self):
+        try:
+            import httpx
+        except ImportError:
+            raise click.ClickException(
+                "httpx is required for --async. pip install nmwdidatatool[async]"
+            )
+
+        limits = httpx.Limits(
+            max_connections=self.concurrency,
+            max_keepalive_connections=self.concurrency,
+        )
+        self._httpx = httpx
+        self._client = httpx.AsyncClient(
+            limits=limits, timeout=DEFAULT_TIMEOUT, auth=self.auth
+        )
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._released = asyncio.Condition()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._client.aclose()
+
+    async def _acquire(self, controller):
+        while not controller.try_acquire():
+            async with self._released:
+                try:
+                    # the timeout catches slots freed by other threads
+                    await asyncio.wait_for(self._released.wait(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _release(self, controller, latency=None, ok=True):
+        controller.release(latency, ok)
+        async with self._released:
+            self._released.notify_all()
+
+    async def get_json(self, url):
+        """
+        GET url and return the decoded JSON or None. requests that fail with a
+        connection error, 429 or 5xx are retried with jittered backoff
+        """
+        if self.verbose:
+            click.secho(f"getting url={url}", fg="green")
+
+        controller = get_controller(url, maximum=self.per_host)
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                await self._acquire(controller)
+                st = time.time()
+                try:
+                    resp = await self._client.get(url)
+                except self._httpx.TransportError:
+                    await self._release(controller, ok=False)
+                    if attempt >= throttle.MAX_RETRIES:
+                        raise
+                    delay = backoff_delay(attempt)
+                else:
+                    self.requests += 1
+                    failed = resp.status_code in RETRY_STATUS
+                    await self._release(controller, time.time() - st, ok=not failed)
+                    if not failed or attempt >= throttle.MAX_RETRIES:
+                        break
+                    delay = backoff_delay(attempt, resp.headers.get("Retry-After"))
+
+            attempt += 1
+            click.secho(
+                f"retrying {url} in {delay:0.1f}s ({attempt}/{throttle.MAX_RETRIES})",
+                fg="yellow",
+            )
+            await asyncio.sleep(delay)
+
+        if resp.status_code != 200:
+            click.secho(f"{url} status={resp.status_code}", fg="red")
+            return
+
+        return resp.json()
+
+    async def first(self, base_url, entity, query=None):
+        """
+        the first entity matching query or None
+        """
+        page = await self.get_json(
+            make_page_url(base_url, entity, query, None, "id asc", 1, 0)
+        )
+        if page and page["value"]:
+            return page["value"][0]
+
+    async def iter_entities(
+        self,
+        base_url,
+        entity="Locations",
+        query=None,
+        pages=1,
+        expand=None,
+        orderby=None,
+        limit=None,
+        prefetch=4,
+        page_size=DEFAULT_PAGE_SIZE,
+    ):
+        """
+        async version of datatool.paging.get_entities. pages=None gets every page.
+        records are yielded in order while up to `prefetch` pages are downloaded
+        concurrently. limit stops after that many records
+        """
+        if orderby is None:
+            orderby = "id asc"
+            if pages and pages < 0:
+                orderby = "id desc"
+        if pages:
+            pages = abs(pages)
+
+        top = min(limit, page_size) if limit else page_size
+
+        def url(skip, top, count=False):
+            return make_page_url(
+                base_url, entity, query, expand, orderby, top, skip, count=count
+            )
+
+        first = await self.get_json(url(0, top, count=True))
+        if not first:
+            return
+
+        yielded = 0
+        for v in first["value"]:
+            if limit and yielded >= limit:
+                return
+            yield v
+            yielded += 1
+
+        if "@iot.nextLink" not in first or (pages and pages <= 1):
+            return
+
+        # the server may cap $top
+        top = len(first["value"])
+        total = first.get("@iot.count")
+        if total is None or not top:
+            page = first
+            npages = 1
+            while "@iot.nextLink" in page and (not pages or npages < pages):
+                page = await self.get_json(page["@iot.nextLink"])
+                if not page:
+                    return
+                for v in page["value"]:
+                    if limit and yielded >= limit:
+                        return
+                    yield v
+                    yielded += 1
+                npages += 1
+            return
+
+        if limit:
+            total = min(total, limit)
+        npages = math.ceil(total / top)
+        if pages:
+            npages = min(npages, pages)
+
+        skips = range(top, npages * top, top)
+        async for page in amap(lambda s: self.get_json(url(s, top)), skips, prefetch):
+            if not page:
+                return
+            for v in page["value"]:
+                if limit and yielded >= limit:
+                    return
+                yield v
+                yielded += 1
+
+
+async def aiterate(items):
+    """
+    iterate a sync or async iterable asynchronously
+    """
+    if hasattr(items, "__aiter__"):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def amap(func, items, window):
+    """
+    async version of datatool.util.ordered_map. func is a coroutine function. up to
+    `window` calls run concurrently and results are yielded in the order of items
+    """
+    pending = deque()
+    try:
+        async for item in aiterate(items):
+            pending.append(asyncio.ensure_future(func(item)))
+            if len(pending) >= window:
+                yield await pending.popleft()
+
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def run_async(func, maxsize=1000, **kw):
+    """
+    iterate the async iterable returned by func(engine) from synchronous code. the
+    event loop runs in a background thread and items are passed back through a
+    bounded queue, so the persister writers can consume them as they arrive.
+    exceptions raised in the loop are re-raised here. kw are passed to AsyncEngine
+    """
+    # checked when called rather than when the first item is requested
+    if session.CACHE is not None:
+        # async requests don't go through the requests session and its cache
+        option = "--replay" if session.REPLAY else "--cache"
+        raise click.ClickException(f"{option} can not be used with --async")
+
+    return _run_async(func, maxsize, **kw)
+
+
+def _run_async(func, maxsize, **kw):
+    q = Queue(maxsize)
+    stop = Event()
+    done = object()
+    error = []
+
+    async def produce():
+        async with AsyncEngine(**kw) as engine:
+            async for item in func(engine):
+                while True:
+                    if stop.is_set():
+                        return
+                    try:
+                        q.put_nowait(item)
+                        break
+                    except Full:
+                        # don't block the loop, other requests are still in flight
+                        await asyncio.sleep(0.01)
+
+    def target():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            error.append(e)
+        finally:
+            while not stop.is_set():
+                try:
+                    q.put(done, timeout=0.5)
+                    break
+                except Full:
+                    pass
+
+    thread = Thread(target=target, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item = q.get(timeout=0.5)
+            except Empty:
+                if not thread.is_alive() and q.empty():
+                    break
+                continue
+
+            if item is done:
+                break
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+    if error:
+        raise error[0]
+
+
+# ============= EOF =============================================
@@ -0,0 +1,318 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+"""
+end-to-end throughput benchmarks. the CLI commands and api endpoints are run against
+a local FakeSTA server, each in its own process, and records/s, request counts and
+peak RSS are reported
+
+    python -m datatool.bench --locations 500 --latency 0.02 --json bench.json
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import click
+import requests
+import yaml
+
+from datatool.fakesta import FakeSTA, serve
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "api")
+
+# name, kind, args, output file name
+SCENARIOS = (
+    (
+        "water depths",
+        "cli",
+        ["water", "depths", "--out", "{out}"],
+        "depths.csv",
+    ),
+    (
+        "water depths --workers 8",
+        "cli",
+        ["water", "depths", "--workers", "8", "--out", "{out}"],
+        "depths.csv",
+    ),
+    (
+        "water depths --resolve expand --workers 8",
+        "cli",
+        ["water", "depths", "--resolve", "expand", "--workers", "8", "--out", "{out}"],
+        "depths.csv",
+    ),
+    (
+        "water depths --async",
+        "cli",
+        ["water", "depths", "--async", "--out", "{out}"],
+        "depths.csv",
+    ),
+    (
+        "locations",
+        "cli",
+        ["locations", "--pages", "100", "--url", "{url}", "--out", "{out}"],
+        "locations.json",
+    ),
+    (
+        "locations --async",
+        "cli",
+        ["locations", "--pages", "100", "--url", "{url}", "--async", "--out", "{out}"],
+        "locations.json",
+    ),
+    (
+        "locations --expand",
+        "cli",
+        [
+            "locations",
+            "--pages",
+            "100",
+            "--url",
+            "{url}",
+            "--expand",
+            "Things/Datastreams",
+            "--out",
+            "{out}",
+        ],
+        "locations.csv",
+    ),
+    (
+        "locations --bbox",
+        "cli",
+        [
+            "locations",
+            "--pages",
+            "100",
+            "--url",
+            "{url}",
+            "--bbox",
+            "-108,33,-106,35",
+            "--out",
+            "{out}",
+        ],
+        "locations.json",
+    ),
+    (
+        "mlocations",
+        "cli",
+        ["mlocations", "--pages", "100", "--sources", "{sources}", "--out", "{out}"],
+        "mlocations.shp",
+    ),
+    (
+        "mlocations --async",
+        "cli",
+        [
+            "mlocations",
+            "--pages",
+            "100",
+            "--sources",
+            "{sources}",
+            "--async",
+            "--out",
+            "{out}",
+        ],
+        "mlocations.shp",
+    ),
+    ("/mrg_locations", "api", ["/mrg_locations"], "mrg_locations.csv"),
+    ("/mrg_waterlevels", "api", ["/mrg_waterlevels"], "mrg_waterlevels.csv"),
+)
+
+
+def count_records(path):
+    if not os.path.isfile(path):
+        return 0
+
+    if path.endswith(".shp"):
+        import shapefile
+
+        with shapefile.Reader(path) as r:
+            return len(r)
+    elif path.endswith(".json"):
+        with open(path) as rfile:
+            return len(json.load(rfile)["data"])
+    else:
+        with open(path) as rfile:
+            return max(sum(1 for _ in rfile) - 1, 0)
+
+
+def run_child(kind, args, result_path):
+    """
+    run one scenario in this process and write the peak RSS to result_path
+    """
+    error = None
+    if kind == "cli":
+        from datatool.cli import cli
+
+        try:
+            cli.main(args, standalone_mode=False)
+        except Exception as e:
+            error = str(e)
+    else:
+        path, out = args
+        sys.path.insert(0, API_DIR)
+        os.chdir(API_DIR)
+        try:
+            from fastapi.testclient import TestClient
+            from wsgi import app
+
+        except ImportError as e:
+            error = f"api not available. {e}"
+        else:
+            try:
+                resp = TestClient(app).get(path)
+                with open(out, "wb") as wfile:
+                    wfile.write(resp.content)
+                if resp.status_code != 200:
+                    error = f"status={resp.status_code}"
+            except Exception as e:
+                error = str(e)
+
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+    with open(result_path, "w") as wfile:
+        json.dump({"maxrss_kb": rusage.ru_maxrss, "error": error}, wfile)
+
+
+def run_scenario(name, kind, args, out_name, server, root):
+    out = os.path.join(root, out_name)
+    sources = os.path.join(root, "sources.yaml")
+    args = [a.format(out=out, url=server.base_url, sources=sources) for a in args]
+    if kind == "api":
+        args = [args[0], out]
+
+    result_path = os.path.join(root, "result.json")
+    env = dict(os.environ)
+    env["NMWDI_STA_URL"] = server.base_url
+    # keep the caches and ~/.sta.yaml of the user out of the benchmark
+    env["HOME"] = root
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(
+        p for p in (package_root, env.get("PYTHONPATH")) if p
+    )
+
+    stats_url = f"{server.base_url.split('/FROST-Server')[0]}/stats"
+    before = requests.get(stats_url).json()
+    st = time.time()
+    subprocess.run(
+        [sys.executable, "-m", "datatool.bench", "child", kind, result_path, *args],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    elapsed = time.time() - st
+    after = requests.get(stats_url).json()
+
+    with open(result_path) as rfile:
+        result = json.load(rfile)
+
+    nrecords = count_records(out)
+    nrequests = {k: v - before.get(k, 0) for k, v in after.items()}
+    return {
+        "name": name,
+        "elapsed": elapsed,
+        "records": nrecords,
+        "records_per_s": nrecords / elapsed if elapsed else 0,
+        "requests": sum(nrequests.values()),
+        "requests_by_endpoint": {k: v for k, v in nrequests.items() if v},
+        "peak_rss_mb": result["maxrss_kb"] / 1024,
+        "error": result["error"],
+    }
+
+
+def run(locations, observations, page_size, latency, only=None):
+    sta = FakeSTA(locations, observations, page_size=page_size, latency=latency)
+    server = serve(sta)
+
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        with open(os.path.join(root, "sources.yaml"), "w") as wfile:
+            yaml.dump(
+                {
+                    "sources": [
+                        {"name": "A", "url": server.base_url},
+                        {
+                            "name": "B",
+                            "url": server.base_url,
+                            "filter": "Location/description eq 'Well'",
+                        },
+                    ]
+                },
+                wfile,
+            )
+
+        for name, kind, args, out_name in SCENARIOS:
+            if only and not any(o in name for o in only):
+                continue
+            results.append(run_scenario(name, kind, args, out_name, server, root))
+            report_line(results[-1])
+
+    server.shutdown()
+    return results
+
+
+def report_line(r):
+    msg = (
+        f"{r['name']:<45} {r['elapsed']:>7.2f}s {r['records']:>8} records "
+        f"{r['records_per_s']:>9.1f} rec/s {r['requests']:>6} requests "
+        f"{r['peak_rss_mb']:>7.1f}MB"
+    )
+    if r["error"]:
+        click.secho(f"{msg} error={r['error']}", fg="red")
+    else:
+        click.secho(msg, fg="green")
+
+
+@click.group(invoke_without_command=True)
+@click.option("--locations", default=200)
+@click.option("--observations", default=200)
+@click.option("--page-size", default=100)
+@click.option("--latency", default=0.01, help="Seconds added to every request")
+@click.option("--only", multiple=True, help="Only run scenarios containing this")
+@click.option("--json", "json_path", default=None, help="Write results to this file")
+@click.pass_context
+def main(ctx, locations, observations, page_size, latency, only, json_path):
+    if ctx.invoked_subcommand:
+        return
+
+    results = run(locations, observations, page_size, latency, only)
+    if json_path:
+        with open(json_path, "w") as wfile:
+            json.dump(
+                {
+                    "locations": locations,
+                    "observations": observations,
+                    "page_size": page_size,
+                    "latency": latency,
+                    "results": results,
+                },
+                wfile,
+                indent=2,
+            )
+
+
+@main.command(context_settings={"ignore_unknown_options": True})
+@click.argument("kind")
+@click.argument("result_path")
+@click.argument("args", nargs=-1, type=click.UNPROCESSED)
+def child(kind, result_path, args):
+    run_child(kind, list(args), result_path)
+
+
+if __name__ == "__main__":
+    main()
+
+# ============= EOF =============================================
@@ -14,26 +14,168 @@
 # limitations under the License.
 # ===============================================================================
 
+import asyncio
 import csv
-import json
 import os
 import pprint
+import time
+from concurrent.futures import ThreadPoolExecutor
 from itertools import groupby
+from queue import Full, Queue
+from threading import Event
 
-import requests
+import numpy
 import shapefile
 import click
+import shapely
 import shapely.wkt
 from shapely.geometry import shape, box
 from shapely.geometry.polygon import Polygon
-from sta.client import Client
 
-from datatool.persister import ObsContainer, woutput
+from datatool.aio import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_PER_HOST,
+    aiterate,
+    amap,
+    configure_engine,
+    run_async,
+)
+from datatool.paging import get_auth, get_entities
+from datatool.persister import (
+    ObsContainer,
+    StreamingObsContainer,
+    CompactObsContainer,
+    configure_compression,
+    output_format,
+    woutput,
+)
+from datatool.geometry import get_geometry_cache
+from datatool.httpcache import (
+    DEFAULT_TTL as DEFAULT_CACHE_TTL,
+    CacheMissError,
+    ResponseCache,
+)
+from datatool.profiling import enable_profiling
+from datatool.session import DEFAULT_POOL_SIZE, configure_session, make_client
+from datatool.sources import load_sources
+from datatool.throttle import DEFAULT_MAX_RETRIES, configure_throttle
+from datatool.util import ordered_map
+from datatool.watermark import WatermarkStore
+
+
+class DataToolGroup(click.Group):
+    def invoke(self, ctx):
+        try:
+            return super().invoke(ctx)
+        except CacheMissError as e:
+            # raised from inside sta/paging when --replay has no cached response
+            raise click.ClickException(
+                f"{e.request.url} is not cached. --replay only uses cached "
+                f"responses, rerun with --cache to fetch it"
+            )
 
 
-@click.group()
-def cli():
-    pass
+@click.group(cls=DataToolGroup)
+@click.option(
+    "--pool-size",
+    default=DEFAULT_POOL_SIZE,
+    help="Number of pooled HTTP connections kept alive per host",
+)
+@click.option(
+    "--concurrency",
+    default=DEFAULT_CONCURRENCY,
+    help="Maximum number of requests in flight with --async",
+)
+@click.option(
+    "--per-host",
+    default=DEFAULT_PER_HOST,
+    help="Maximum number of requests in flight per host with --async",
+)
+@click.option(
+    "--adaptive/--no-adaptive",
+    default=True,
+    help="Adapt the number of requests in flight per host to the server's "
+    "latency and errors",
+)
+@click.option(
+    "--max-retries",
+    default=DEFAULT_MAX_RETRIES,
+    help="Retries of GET requests that fail with a connection error, 429 or 5xx",
+)
+@click.option(
+    "--cache",
+    is_flag=True,
+    help="Cache SensorThings responses on disk and reuse them on later runs",
+)
+@click.option("--cache-dir", default=None, help="Defaults to ~/.sta.http_cache")
+@click.option(
+    "--cache-ttl",
+    default=DEFAULT_CACHE_TTL,
+    help="Seconds before a cached response is revalidated with the server",
+)
+@click.option(
+    "--cache-size", default=500, help="Maximum size of the response cache in MB"
+)
+@click.option(
+    "--replay",
+    is_flag=True,
+    help="Only serve responses from the cache. Requests that are not cached fail",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    help="Print a per stage timing, request and memory report on exit",
+)
+@click.option("--profile-json", default=None, help="Also write the report as JSON")
+@click.option(
+    "--compress-level",
+    default=None,
+    type=int,
+    help="Compression level for .gz, .bz2, .xz and .zst outputs. Defaults to 6 for "
+    "gzip and 3 for zstd",
+)
+@click.option(
+    "--compress-threads",
+    default=0,
+    help="Worker threads used to compress .zst outputs. -1 uses one per core",
+)
+@click.pass_context
+def cli(
+    ctx,
+    pool_size,
+    concurrency,
+    per_host,
+    adaptive,
+    max_retries,
+    cache,
+    cache_dir,
+    cache_ttl,
+    cache_size,
+    replay,
+    profile,
+    profile_json,
+    compress_level,
+    compress_threads,
+):
+    rcache = None
+    if cache or replay:
+        rcache = ResponseCache(cache_dir, ttl=cache_ttl, max_size=cache_size * 1024**2)
+
+        def report():
+            click.secho(
+                f"http cache hits={rcache.hits} misses={rcache.misses}", fg="yellow"
+            )
+
+        ctx.call_on_close(report)
+
+    configure_session(pool_size, cache=rcache, replay=replay)
+    configure_compression(compress_level, compress_threads)
+    configure_engine(concurrency, per_host)
+    configure_throttle(adaptive, max_retries)
+
+    if profile or profile_json:
+        profiler = enable_profiling()
+        ctx.call_on_close(lambda: profiler.print_report(profile_json))
 
 
 @cli.group()
@@ -51,9 +193,67 @@ def water():
 @click.option("--out", default=None)
 @click.option("--screen", is_flag=True)
 @click.option("--verbose", is_flag=True)
-def depths(location, agency, within, last, out, screen, verbose):
+@click.option(
+    "--workers",
+    default=None,
+    type=int,
+    help="Number of locations to fetch concurrently. Output order is preserved. "
+    "Defaults to 1, or --concurrency with --async",
+)
+@click.option(
+    "--resolve",
+    type=click.Choice(["lookup", "expand"]),
+    default="lookup",
+    help="How to find each location's Thing/Datastream. 'lookup' queries them per "
+    "location, 'expand' gets them with the locations in a single expanded query",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Write observations while they are downloaded instead of collecting each "
+    "datastream in memory first",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only fetch observations newer than the last export and append them to "
+    "--out (csv only). Progress is saved after each location so an interrupted "
+    "run resumes where it stopped",
+)
+@click.option(
+    "--async",
+    "use_async",
+    is_flag=True,
+    help="Fetch with the asyncio engine instead of threads",
+)
+def depths(
+    location,
+    agency,
+    within,
+    last,
+    out,
+    screen,
+    verbose,
+    workers,
+    resolve,
+    stream,
+    incremental,
+    use_async,
+):
     water_obs(
-        location, agency, within, last, out, screen, verbose, "Groundwater Levels"
+        location,
+        agency,
+        within,
+        last,
+        out,
+        screen,
+        verbose,
+        "Groundwater Levels",
+        workers=workers,
+        resolve=resolve,
+        stream=stream,
+        incremental=incremental,
+        use_async=use_async,
     )
 
 
@@ -65,19 +265,119 @@ def depths(location, agency, within, last, out, screen, verbose):
 @click.option("--out", default=None)
 @click.option("--screen", is_flag=True)
 @click.option("--verbose", is_flag=True)
-def elevations(location, agency, within, last, out, screen, verbose):
+@click.option(
+    "--workers",
+    default=None,
+    type=int,
+    help="Number of locations to fetch concurrently. Output order is preserved. "
+    "Defaults to 1, or --concurrency with --async",
+)
+@click.option(
+    "--resolve",
+    type=click.Choice(["lookup", "expand"]),
+    default="lookup",
+    help="How to find each location's Thing/Datastream. 'lookup' queries them per "
+    "location, 'expand' gets them with the locations in a single expanded query",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    help="Write observations while they are downloaded instead of collecting each "
+    "datastream in memory first",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    help="Only fetch observations newer than the last export and append them to "
+    "--out (csv only). Progress is saved after each location so an interrupted "
+    "run resumes where it stopped",
+)
+@click.option(
+    "--async",
+    "use_async",
+    is_flag=True,
+    help="Fetch with the asyncio engine instead of threads",
+)
+def elevations(
+    location,
+    agency,
+    within,
+    last,
+    out,
+    screen,
+    verbose,
+    workers,
+    resolve,
+    stream,
+    incremental,
+    use_async,
+):
     water_obs(
-        location, agency, within, last, out, screen, verbose, "Groundwater Elevations"
+        location,
+        agency,
+        within,
+        last,
+        out,
+        screen,
+        verbose,
+        "Groundwater Elevations",
+        workers=workers,
+        resolve=resolve,
+        stream=stream,
+        incremental=incremental,
+        use_async=use_async,
     )
 
 
-def water_obs(location, agency, within, last, out, screen, verbose, dsname):
-    client = Client()
+def water_obs(
+    location,
+    agency,
+    within,
+    last,
+    out,
+    screen,
+    verbose,
+    dsname,
+    workers=None,
+    resolve="lookup",
+    stream=False,
+    incremental=False,
+    use_async=False,
+):
+    if stream and screen:
+        warning("--stream is ignored when writing to the screen")
+        stream = False
+
+    if stream and use_async:
+        warning("--stream is ignored with --async")
+        stream = False
+
+    watermarks = None
+    if incremental:
+        if not (out and output_format(out) == ".csv"):
+            raise click.ClickException("--incremental requires a .csv --out")
+        watermarks = WatermarkStore()
+        try:
+            removed = watermarks.restore_output(out)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if removed:
+            warning(
+                f"removed {removed} bytes written to {out} after the last saved "
+                f"watermark"
+            )
+
+    # tabular outputs only use phenomenonTime, resultTime and result so the
+    # observations can be held in packed arrays. JSON output keeps the full payload
+    compact = bool(out) and output_format(out) in (".csv", ".parquet", ".arrow")
+
+    client = make_client()
     filter_args = []
+    within_poly = None
     if within:
-        wkt = make_wkt(within)
-        if wkt:
-            filter_args.append(make_within(wkt))
+        f, within_poly = make_within_prefilter(within)
+        if f:
+            filter_args.append(f)
     if agency:
         filter_args.append(f"properties/agency eq '{agency}'")
 
@@ -90,36 +390,252 @@ def water_obs(location, agency, within, last, out, screen, verbose, dsname):
     if filter_args:
         query = " and ".join(filter_args)
 
-    def obs_generator():
-        for loc in client.get_locations(query=query):
-            thing = client.get_thing(name="Water Well", location=loc)
-            ds = client.get_datastream(name=dsname, thing=thing)
-
-            orderby = None
-            limit = None
-            if last:
-                limit = last
-                orderby = "phenomenonTime desc"
-
-            obss = list(
-                client.get_observations(
-                    ds, verbose=verbose, limit=limit, orderby=orderby
-                )
+    orderby = None
+    limit = None
+    if last:
+        limit = last
+        orderby = "phenomenonTime desc"
+
+    def get_obsquery(ds):
+        if watermarks:
+            mark = watermarks.get(out, client.base_url, ds["@iot.id"])
+            if mark:
+                # an interval phenomenonTime is stored as start/end
+                return f"phenomenonTime gt {mark.split('/')[-1]}"
+
+    def make_container(loc, thing, ds, obss):
+        if stream:
+            return StreamingObsContainer(loc, thing, ds, obss)
+        elif compact:
+            return CompactObsContainer(loc, thing, ds, obss)
+
+        return ObsContainer(loc, thing, ds, list(obss))
+
+    if use_async:
+        containers = run_async(
+            lambda engine: async_water_obs(
+                engine,
+                client.base_url,
+                query,
+                dsname,
+                resolve,
+                within_poly,
+                get_obsquery,
+                make_container,
+                workers or engine.concurrency,
+                limit=limit,
+                orderby=orderby,
+            ),
+            verbose=verbose,
+            auth=get_auth(client),
+        )
+    else:
+        if resolve == "expand":
+            items = get_well_datastreams(client, query, dsname, within=within_poly)
+        else:
+            locs = filter_within(client.get_locations(query=query), within_poly)
+            items = ((loc, None, None) for loc in locs)
+
+        def get_obs(item):
+            loc, thing, ds = item
+            if ds is None:
+                # sta's get_thing/get_datastream raise StopIteration when nothing
+                # matches
+                try:
+                    thing = client.get_thing(name="Water Well", location=loc)
+                except StopIteration:
+                    warning(f"no 'Water Well' Thing for location={loc['name']}")
+                    return
+                try:
+                    ds = client.get_datastream(name=dsname, thing=thing)
+                except StopIteration:
+                    warning(f"no '{dsname}' Datastream for location={loc['name']}")
+                    return
+
+            obss = get_observations(
+                client,
+                ds,
+                query=get_obsquery(ds),
+                verbose=verbose,
+                limit=limit,
+                orderby=orderby,
             )
+            return make_container(loc, thing, ds, obss)
+
+        containers = ordered_map(get_obs, items, workers or 1)
 
-            count = len(obss)
-            yield ObsContainer(loc, thing, ds, obss)
-            # count = 0
-            # for obs in client.get_observations(ds, verbose=verbose):
-            #     count += 1
-            #     yield obs
+    def obs_generator():
+        for obsc in containers:
+            if obsc is None:
+                continue
+
+            yield obsc
+
+            if watermarks:
+                watermarks.update(
+                    out,
+                    client.base_url,
+                    obsc.datastream["@iot.id"],
+                    obsc.latest_phenomenon_time,
+                )
+                # the writer has closed out before asking for the next container
+                watermarks.update_output(out)
+                watermarks.save()
 
+            loc = obsc.location
             click.secho(
-                f"got observations {count} for location={loc['name']}, {loc['@iot.id']}\n",
+                f"got observations {obsc.nobs} for location={loc['name']}, {loc['@iot.id']}\n",
                 fg="green",
             )
 
-    woutput(screen, out, obs_generator(), None, client.base_url)
+    woutput(screen, out, obs_generator(), None, client.base_url, append=incremental)
+
+
+async def async_water_obs(
+    engine,
+    base_url,
+    query,
+    dsname,
+    resolve,
+    within_poly,
+    get_obsquery,
+    make_container,
+    window,
+    limit=None,
+    orderby=None,
+):
+    """
+    async version of the water_obs fetch. yields an ObsContainer per location, in
+    location order, with up to `window` locations fetched concurrently
+    """
+    if resolve == "expand":
+        expand = (
+            f"Things($filter=name eq 'Water Well')"
+            f"/Datastreams($filter=name eq '{dsname}')"
+        )
+    else:
+        expand = None
+
+    locs = engine.iter_entities(
+        base_url, "Locations", query=query, pages=None, expand=expand
+    )
+
+    async def get_obs(loc):
+        if resolve == "expand":
+            item = split_well_datastream(loc, dsname)
+            if item is None:
+                return
+            loc, thing, ds = item
+        else:
+            thing = await engine.first(
+                base_url, f"Locations({loc['@iot.id']})/Things", "name eq 'Water Well'"
+            )
+            if thing is None:
+                warning(f"no 'Water Well' Thing for location={loc['name']}")
+                return
+            ds = await engine.first(
+                base_url,
+                f"Things({thing['@iot.id']})/Datastreams",
+                f"name eq '{dsname}'",
+            )
+            if ds is None:
+                warning(f"no '{dsname}' Datastream for location={loc['name']}")
+                return
+
+        obss = [
+            o
+            async for o in engine.iter_entities(
+                base_url,
+                f"Datastreams({ds['@iot.id']})/Observations",
+                query=get_obsquery(ds),
+                pages=None,
+                orderby=orderby,
+                limit=limit,
+            )
+        ]
+        return make_container(loc, thing, ds, obss)
+
+    async for obsc in amap(get_obs, afilter_within(locs, within_poly), window):
+        if obsc is not None:
+            yield obsc
+
+
+def get_observations(client, datastream, query=None, **kw):
+    """
+    client.get_observations does not accept a $filter so filtered requests go
+    through the datastream's Observations entity directly
+    """
+    if query is None:
+        return client.get_observations(datastream, **kw)
+
+    if isinstance(datastream, dict):
+        datastream = datastream["@iot.id"]
+    entity = f"Datastreams({datastream})/Observations"
+    return client.get_datastreams(query, entity=entity, **kw)
+
+
+def get_well_datastreams(client, query, dsname, thing_name="Water Well", within=None):
+    """
+    yield (location, thing, datastream) for each location matching query. the
+    Thing and Datastream are retrieved with the locations using a single paged
+    $expand query instead of two lookups per location. locations without a
+    matching Thing/Datastream are skipped
+    """
+    expand = (
+        f"Things($filter=name eq '{thing_name}')"
+        f"/Datastreams($filter=name eq '{dsname}')"
+    )
+    locs = client.get_locations(query=query, expand=expand)
+    for loc in filter_within(locs, within):
+        item = split_well_datastream(loc, dsname, thing_name)
+        if item:
+            yield item
+
+
+def split_well_datastream(loc, dsname, thing_name="Water Well"):
+    """
+    returns (location, thing, datastream) from a location with expanded
+    Things/Datastreams or None when the Thing or Datastream is missing
+    """
+    things = loc.pop("Things", None)
+    if not things:
+        warning(f"no '{thing_name}' Thing for location={loc['name']}")
+        return
+
+    thing = things[0]
+    datastreams = thing.pop("Datastreams", None)
+    if not datastreams:
+        warning(f"no '{dsname}' Datastream for location={loc['name']}")
+        return
+
+    return loc, thing, datastreams[0]
+
+
+@cli.group()
+def geometry():
+    pass
+
+
+@geometry.command()
+@click.option("--state", help="Only refresh this state's counties, e.g. NM")
+def refresh(state):
+    """Refetch cached state and county boundaries"""
+    get_geometry_cache().refresh(state)
+
+
+@geometry.command()
+@click.argument("path")
+def seed(path):
+    """Load a states/counties GeoJSON FeatureCollection into the geometry cache"""
+    get_geometry_cache().seed(path)
+
+
+@geometry.command()
+@click.argument("path")
+def export(path):
+    """Write the geometry cache as GeoJSON, e.g. to seed another machine"""
+    n = get_geometry_cache().export(path)
+    click.secho(f"wrote {n} features to {path}", fg="yellow")
 
 
 @cli.command()
@@ -128,7 +644,7 @@ def water_obs(location, agency, within, last, out, screen, verbose, dsname):
 @click.option("--verbose/--no-verbose", default=False)
 @click.option("--out", default="out.json")
 def things(name, agency, verbose, out):
-    client = Client()
+    client = make_client()
 
     query = []
     if name:
@@ -171,12 +687,24 @@ def things(name, agency, verbose, out):
 @click.option(
     "--out",
     help="Location to save file. use file extension to define output type. "
-    "valid extensions are .shp, .csv, and .json. JSON output is used by "
-    "default",
+    "valid extensions are .shp, .csv, .json, .ndjson, .parquet and .arrow. JSON output "
+    "is used by "
+    "default. Add .gz, .bz2, .xz or .zst to compress csv/json/ndjson output",
 )
 @click.option("--url", default=None)
 @click.option("--group", default=None)
 @click.option("--names-only", is_flag=True)
+@click.option(
+    "--prefetch",
+    default=4,
+    help="Number of result pages to download concurrently. Results stay in order",
+)
+@click.option(
+    "--async",
+    "use_async",
+    is_flag=True,
+    help="Fetch with the asyncio engine instead of threads",
+)
 def locations(
     name,
     agency,
@@ -191,8 +719,10 @@ def locations(
     url,
     group,
     names_only,
+    prefetch,
+    use_async,
 ):
-    client = Client(base_url=url)
+    client = make_client(base_url=url)
 
     filterargs = []
     if name:
@@ -212,10 +742,11 @@ def locations(
         # )
         f = make_bbox_filter(bbox)
         filterargs.append(f)
-    elif within:
-        wkt = make_wkt(within)
-        if wkt:
-            filterargs.append(make_within(wkt))
+    within_poly = None
+    if not bbox and within:
+        f, within_poly = make_within_prefilter(within, pages)
+        if f:
+            filterargs.append(f)
 
     query = " and ".join(filterargs)
     # if verbose:
@@ -224,10 +755,33 @@ def locations(
     if out == "out.json":
         out = "out.locations.json"
 
+    if use_async:
+        locs = run_async(
+            lambda engine: engine.iter_entities(
+                client.base_url,
+                "Locations",
+                query=query,
+                pages=pages,
+                expand=expand,
+                prefetch=prefetch,
+            ),
+            verbose=verbose,
+            auth=get_auth(client),
+        )
+    else:
+        locs = get_entities(
+            client,
+            "Locations",
+            query=query,
+            pages=pages,
+            expand=expand,
+            verbose=verbose,
+            workers=prefetch,
+        )
     woutput(
         screen,
         out,
-        client.get_locations(query=query, pages=pages, expand=expand, verbose=verbose),
+        filter_within(locs, within_poly),
         query,
         client.base_url,
         group=group,
@@ -252,12 +806,26 @@ def locations(
 @click.option(
     "--out",
     help="Location to save file. use file extension to define output type. "
-    "valid extensions are .shp, .csv, and .json. JSON output is used by "
-    "default",
+    "valid extensions are .shp, .csv, .json, .ndjson, .parquet and .arrow. JSON output "
+    "is used by "
+    "default. Add .gz, .bz2, .xz or .zst to compress csv/json/ndjson output",
 )
 @click.option("--url", default=None)
 @click.option("--group", default=None)
 @click.option("--names-only", is_flag=True)
+@click.option(
+    "--sources",
+    default=None,
+    help="yaml file listing the SensorThings sources to query. Defaults to "
+    "~/.sta.sources.yaml or the built in NMBGMR and USGS sources",
+)
+@click.option("--source", multiple=True, help="Only query the named source. Repeatable")
+@click.option(
+    "--async",
+    "use_async",
+    is_flag=True,
+    help="Fetch with the asyncio engine instead of threads",
+)
 def mlocations(
     query,
     pages,
@@ -270,39 +838,165 @@ def mlocations(
     url,
     group,
     names_only,
+    sources,
+    source,
+    use_async,
 ):
-    urls = [
-        ("NMBGMR", "st2.newmexicowaterdata.org"),
-        # ("OSE", "ose.newmexicowaterdata.org"),
-        ("USGS", "https://labs.waterdata.usgs.gov/sta/v1.1"),
-    ]
-    # urls = ['https://labs.waterdata.usgs.gov/sta/v1.1']
+    sources = load_sources(sources, source)
+
+    server_filter, within_poly = None, None
+    if within:
+        server_filter, within_poly = make_within_prefilter(within, pages)
+    elif bbox:
+        server_filter = make_bbox_filter(bbox)
+
     if out and out.endswith(".shp"):
         with shapefile.Writer(out) as w:
             w.field("name", "C")
             w.field("source_url", "C")
             w.field("id", "C")
             w.field("agency", "C")
-            for da, url in urls:
-                client = Client(base_url=url)
-                filterargs = []
-                if da == "USGS":
-                    filterargs.append("Location/description eq 'Well'")
-
-                if within:
-                    wkt = make_wkt(within)
-                    if wkt:
-                        wktwithin = make_within(wkt)
-                        if wktwithin:
-                            filterargs.append(wktwithin)
-                elif bbox:
-                    wkt = make_bbox_filter(bbox)
-                    if wkt:
-                        filterargs.append(wkt)
-
-                query = " and ".join(filterargs)
-                locs = client.get_locations(pages=pages, query=query, verbose=True)
-                output(w, url, locs, da)
+
+            timings = {}
+            if use_async:
+                records = run_async(
+                    lambda engine: async_federated_locations(
+                        engine, sources, server_filter, within_poly, pages, timings
+                    )
+                )
+            else:
+                records = federated_locations(
+                    sources, server_filter, within_poly, pages, timings
+                )
+            for i, (src, r) in enumerate(records):
+                if verbose:
+                    print(i, src["name"], r)
+                write_location(w, src["url"], r, src["name"])
+
+        timing_report(timings)
+
+
+def federated_locations(sources, query, within_poly, pages, timings, maxsize=5000):
+    """
+    page through the locations of every source concurrently, one thread per source.
+    records are yielded as (source, record) through a single bounded queue so the
+    caller can write them from one thread. per source timings are stored in timings
+    """
+    q = Queue(maxsize)
+    stop = Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except Full:
+                pass
+
+    def worker(src):
+        timing = timings[src["name"]] = {"records": 0, "first": None, "error": None}
+        st = time.time()
+        try:
+            client = make_client(base_url=src["url"])
+            filterargs = [f for f in (src.get("filter"), query) if f]
+            locs = get_entities(
+                client, "Locations", query=" and ".join(filterargs), pages=pages
+            )
+            for r in filter_within(locs, within_poly):
+                if timing["first"] is None:
+                    timing["first"] = time.time() - st
+                if not put((src, r)):
+                    return
+                timing["records"] += 1
+        except CacheMissError as e:
+            # --replay misses fail the command rather than one source
+            timing["error"] = str(e)
+            put((src, e))
+        except Exception as e:
+            timing["error"] = str(e)
+        finally:
+            timing["elapsed"] = time.time() - st
+            put((src, done))
+
+    with ThreadPoolExecutor(max_workers=max(len(sources), 1)) as executor:
+        for src in sources:
+            executor.submit(worker, src)
+
+        try:
+            remaining = len(sources)
+            while remaining:
+                src, r = q.get()
+                if r is done:
+                    remaining -= 1
+                elif isinstance(r, CacheMissError):
+                    raise r
+                else:
+                    yield src, r
+        finally:
+            stop.set()
+
+
+async def async_federated_locations(
+    engine, sources, query, within_poly, pages, timings, maxsize=5000
+):
+    """
+    async version of federated_locations. every source is paged by its own task in
+    the engine's event loop
+    """
+    q = asyncio.Queue(maxsize)
+    done = object()
+
+    async def worker(src):
+        timing = timings[src["name"]] = {"records": 0, "first": None, "error": None}
+        st = time.time()
+        try:
+            filterargs = [f for f in (src.get("filter"), query) if f]
+            locs = engine.iter_entities(
+                src["url"], "Locations", query=" and ".join(filterargs), pages=pages
+            )
+            async for r in afilter_within(locs, within_poly):
+                if timing["first"] is None:
+                    timing["first"] = time.time() - st
+                await q.put((src, r))
+                timing["records"] += 1
+        except CacheMissError as e:
+            timing["error"] = str(e)
+            await q.put((src, e))
+        except Exception as e:
+            timing["error"] = str(e)
+        finally:
+            timing["elapsed"] = time.time() - st
+            await q.put((src, done))
+
+    tasks = [asyncio.ensure_future(worker(src)) for src in sources]
+    try:
+        remaining = len(sources)
+        while remaining:
+            src, r = await q.get()
+            if r is done:
+                remaining -= 1
+            elif isinstance(r, CacheMissError):
+                raise r
+            else:
+                yield src, r
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def timing_report(timings):
+    click.secho("=============== Sources ===============", fg="yellow")
+    for name, t in timings.items():
+        first = "-" if t["first"] is None else f"{t['first']:0.2f}s"
+        msg = (
+            f"{name:<10} records={t['records']:<8} first={first:<8} "
+            f"elapsed={t.get('elapsed', 0):0.2f}s"
+        )
+        if t["error"]:
+            warning(f"{msg} error={t['error']}")
+        else:
+            click.secho(msg, fg="green")
 
 
 @cli.command()
@@ -322,10 +1016,17 @@ def mlocations(
 @click.option(
     "--out",
     help="Location to save file. use file extension to define output type. "
-    "valid extensions are .shp, .csv, and .json. JSON output is used by "
-    "default",
+    "valid extensions are .shp, .csv, .json, .ndjson, .parquet and .arrow. JSON output "
+    "is used by "
+    "default. Add .gz, .bz2, .xz or .zst to compress csv/json/ndjson output",
 )
-def pods(query, pages, expand, within, bbox, screen, verbose, out):
+@click.option(
+    "--async",
+    "use_async",
+    is_flag=True,
+    help="Fetch with the asyncio engine instead of threads",
+)
+def pods(query, pages, expand, within, bbox, screen, verbose, out, use_async):
     url = "ose.newmexicowaterdata.org"
     # urls = ['https://labs.waterdata.usgs.gov/sta/v1.1']
     if out and out.endswith(".shp"):
@@ -335,7 +1036,7 @@ def pods(query, pages, expand, within, bbox, screen, verbose, out):
             w.field("id", "C")
             w.field("agency", "C")
 
-            client = Client(base_url=url)
+            client = make_client(base_url=url)
             filterargs = []
 
             if within:
@@ -350,7 +1051,16 @@ def pods(query, pages, expand, within, bbox, screen, verbose, out):
                     filterargs.append(wkt)
 
             query = " and ".join(filterargs)
-            locs = client.get_locations(pages=pages, query=query, verbose=True)
+            if use_async:
+                locs = run_async(
+                    lambda engine: engine.iter_entities(
+                        url, "Locations", query=query, pages=pages
+                    ),
+                    verbose=True,
+                    auth=get_auth(client),
+                )
+            else:
+                locs = client.get_locations(pages=pages, query=query, verbose=True)
             output(w, url, locs, "OSE")
 
 
@@ -358,15 +1068,19 @@ def output(writer, url, records, default_agency):
     print(f"=============== {url} ===============")
     for i, r in enumerate(records):
         print(i, r)
-        geom = r["location"]
-        coords = geom["coordinates"]
-        writer.point(*coords)
-        writer.record(
-            name=r["name"],
-            source_url=url,
-            id=r["@iot.id"],
-            agency=r.get("properties", {}).get("agency", default_agency),
-        )
+        write_location(writer, url, r, default_agency)
+
+
+def write_location(writer, url, r, default_agency):
+    geom = r["location"]
+    coords = geom["coordinates"]
+    writer.point(*coords)
+    writer.record(
+        name=r["name"],
+        source_url=url,
+        id=r["@iot.id"],
+        agency=r.get("properties", {}).get("agency", default_agency),
+    )
 
 
 def make_bbox_filter(bbox):
@@ -378,6 +1092,88 @@ def make_within(wkt):
     return f"st_within(Location/location, geography'{wkt}')"
 
 
+def make_within_prefilter(within, pages=None):
+    """
+    returns a cheap bounding box st_within filter for the server and the polygon
+    that filter_within should use to do the exact test locally. the polygon is None
+    when the bounding box is already exact.
+
+    when pages is bounded the exact polygon is sent instead. --pages counts pages of
+    records within the polygon, bounding box candidates filtered after the page
+    limit would return fewer records
+    """
+    wkt = make_wkt(within)
+    if not wkt:
+        return None, None
+
+    if pages:
+        return make_within(wkt), None
+
+    poly = shapely.wkt.loads(str(wkt))
+    bbox = box(*poly.bounds)
+    if poly.equals(bbox):
+        return make_within(bbox.wkt), None
+
+    return make_within(bbox.wkt), poly
+
+
+def filter_within(records, poly, chunksize=1000):
+    """
+    yield the records whose location is within poly. records are tested in chunks
+    with vectorized shapely predicates. order is preserved
+    """
+    if poly is None:
+        yield from records
+        return
+
+    shapely.prepare(poly)
+    chunk = []
+    for r in records:
+        chunk.append(r)
+        if len(chunk) >= chunksize:
+            yield from _filter_within_chunk(chunk, poly)
+            chunk = []
+
+    if chunk:
+        yield from _filter_within_chunk(chunk, poly)
+
+
+async def afilter_within(records, poly, chunksize=1000):
+    """
+    filter_within for async iterables
+    """
+    if poly is None:
+        async for r in aiterate(records):
+            yield r
+        return
+
+    shapely.prepare(poly)
+    chunk = []
+    async for r in aiterate(records):
+        chunk.append(r)
+        if len(chunk) >= chunksize:
+            for rr in _filter_within_chunk(chunk, poly):
+                yield rr
+            chunk = []
+
+    if chunk:
+        for rr in _filter_within_chunk(chunk, poly):
+            yield rr
+
+
+def _filter_within_chunk(chunk, poly):
+    geoms = [r["location"] for r in chunk]
+    if all(g["type"] == "Point" for g in geoms):
+        xy = numpy.array([g["coordinates"][:2] for g in geoms], dtype=float)
+        mask = shapely.contains_xy(poly, xy[:, 0], xy[:, 1])
+    else:
+        mask = shapely.contains(poly, [shape(g) for g in geoms])
+
+    for r, m in zip(chunk, mask):
+        if m:
+            yield r
+
+
 def make_wkt(within):
     wkt = None
     if os.path.isfile(within):
@@ -406,41 +1202,11 @@ def make_wkt(within):
 
 
 def statelookup(shortname):
-    p = os.path.join(os.path.expanduser("~"), ".sta.states.json")
-    if not os.path.isfile(p):
-        click.secho(f"Caching states to {p}")
-        url = f"https://reference.geoconnex.us/collections/states/items?f=json"
-        resp = requests.get(url)
-        with open(p, "w") as wfile:
-            json.dump(resp.json(), wfile)
-
-    with open(p, "r") as rfile:
-        obj = json.load(rfile)
-
-    shortname = shortname.lower()
-    for f in obj["features"]:
-        props = f["properties"]
-        if props["STUSPS"].lower() == shortname:
-            return props["STATEFP"]
+    return get_geometry_cache().statefp(shortname)
 
 
 def get_state_polygon(state):
-    statefp = statelookup(state)
-    if statefp:
-        p = os.path.join(os.path.expanduser("~"), f".sta.{state}.json")
-        if not os.path.isfile(p):
-            click.secho(f"Caching {state} counties to {p}")
-            url = f"https://reference.geoconnex.us/collections/states/items/{statefp}?&f=json"
-            resp = requests.get(url)
-
-            obj = resp.json()
-            with open(p, "w") as wfile:
-                json.dump(obj, wfile)
-
-        with open(p, "r") as rfile:
-            obj = json.load(rfile)
-
-        return Polygon(obj["geometry"]["coordinates"][0][0])
+    return get_geometry_cache().state_polygon(state)
 
 
 def get_state_bb(state):
@@ -455,30 +1221,16 @@ def get_county_polygon(name):
         state = "NM"
         county = name
 
-    statefp = statelookup(state)
-    if statefp:
-        p = os.path.join(os.path.expanduser("~"), f".sta.{state}.counties.json")
-        if not os.path.isfile(p):
-            click.secho(f"Caching {state} counties to {p}")
-            url = f"https://reference.geoconnex.us/collections/counties/items?STATEFP={statefp}&f=json"
-            resp = requests.get(url)
-
-            obj = resp.json()
-            with open(p, "w") as wfile:
-                json.dump(obj, wfile)
-
-        with open(p, "r") as rfile:
-            obj = json.load(rfile)
-
-        county = county.lower()
-        for f in obj["features"]:
-            if f["properties"]["NAME"].lower() == county:
-                return Polygon(f["geometry"]["coordinates"][0][0]).wkt
+    cache = get_geometry_cache()
+    if cache.statefp(state):
+        poly = cache.county_polygon(state, county)
+        if poly is not None:
+            return poly.wkt
         else:
-            warning(f"county '{county}' does not exist")
+            warning(f"county '{county.lower()}' does not exist")
             warning("---------- Valid county names -------------")
-            for f in obj["features"]:
-                warning(f["properties"]["NAME"])
+            for n in cache.county_names(state):
+                warning(n)
             warning("--------------------------------------------")
     else:
         warning(f"Invalid state. {state}")
@@ -0,0 +1,410 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+"""
+local stand-in for a FROST SensorThings server with synthetic Locations, Things,
+Datastreams and Observations. supports the subset of the API used by this package:
+$top/$skip paging with @iot.nextLink, $orderby on id/phenomenonTime, simple $filter
+clauses (name, startswith, agency, st_within, phenomenonTime gt) and
+Things/Datastreams $expand. errors (503) and rate limiting (429) can be injected.
+used by datatool.bench
+
+    python -m datatool.fakesta --port 8080 --locations 2000 --latency 0.05
+"""
+
+import json
+import random
+import re
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlsplit
+
+import click
+import shapely
+import shapely.wkt
+
+from datatool.persister import parse_timestamp
+
+ROOT = "/FROST-Server/v1.1"
+AGENCIES = ("CABQ", "ISC_SEVEN_RIVERS", "PVACD", "EBID")
+DATASTREAMS = ("Groundwater Levels", "Groundwater Elevations")
+OBS_START = datetime(2000, 1, 1, tzinfo=timezone.utc)
+OBS_STEP = timedelta(days=1)
+
+ENTITY_RE = re.compile(r"^(?P<entity>\w+)(\((?P<id>\d+)\))?$")
+CLAUSES = (
+    ("name", re.compile(r"^name eq '(?P<v>.*)'$")),
+    ("startswith", re.compile(r"^startswith\(name, ?'(?P<v>.*)'\)$")),
+    ("agency", re.compile(r"^properties/agency eq '(?P<v>.*)'$")),
+    ("description", re.compile(r"^Location/description eq '(?P<v>.*)'$")),
+    ("within", re.compile(r"^st_within\(Location/location, ?geography'(?P<v>.*)'\)$")),
+    ("ptime_gt", re.compile(r"^phenomenonTime gt (?P<v>.*)$")),
+)
+EXPAND_RE = re.compile(r"^(?P<name>\w+)(\(\$filter=name eq '(?P<v>[^']*)'\))?$")
+
+
+def fmt_time(t):
+    return f"{t:%Y-%m-%dT%H:%M:%S}.000Z"
+
+
+class FakeSTA:
+    """
+    synthetic dataset. every location has one "Water Well" Thing with a
+    Groundwater Levels and a Groundwater Elevations datastream. observations are
+    generated on request so large datasets need no memory
+    """
+
+    def __init__(
+        self,
+        nlocations=1000,
+        nobservations=500,
+        page_size=1000,
+        latency=0,
+        bounds=(-109.05, 31.33, -103.0, 37.0),
+        seed=1,
+        error_rate=0,
+        capacity=None,
+    ):
+        rng = random.Random(seed)
+        self.page_size = page_size
+        self.latency = latency
+        # fraction of requests answered with a 503, and the number of concurrent
+        # requests above which requests are answered with a 429
+        self.error_rate = error_rate
+        self.capacity = capacity
+        self.inflight = 0
+        self._rng = random.Random(seed)
+        self.nobservations = nobservations
+        self.base_url = None
+
+        self.locations = []
+        for i in range(1, nlocations + 1):
+            x = rng.uniform(bounds[0], bounds[2])
+            y = rng.uniform(bounds[1], bounds[3])
+            self.locations.append(
+                {
+                    "@iot.id": i,
+                    "name": f"WL-{i:05d}",
+                    "description": "Well",
+                    "encodingType": "application/vnd.geo+json",
+                    "location": {"type": "Point", "coordinates": [x, y]},
+                    "properties": {
+                        "agency": AGENCIES[i % len(AGENCIES)],
+                        "Altitude": 5000 + i % 1000,
+                    },
+                }
+            )
+        self._points = shapely.points(
+            [loc["location"]["coordinates"] for loc in self.locations]
+        )
+
+        self.requests = Counter()
+        # requests that sent an Authorization header
+        self.authorized = 0
+        self._lock = Lock()
+
+    # entities
+    def thing(self, lid):
+        return {
+            "@iot.id": lid,
+            "name": "Water Well",
+            "description": "Water Well",
+            "properties": {"WellDepth": 100 + lid % 500},
+        }
+
+    def datastream(self, tid, idx):
+        return {
+            "@iot.id": tid * len(DATASTREAMS) + idx,
+            "name": DATASTREAMS[idx],
+            "description": DATASTREAMS[idx],
+            "unitOfMeasurement": {"name": "Foot", "symbol": "ft", "definition": ""},
+        }
+
+    def observation(self, dsid, i):
+        t = fmt_time(OBS_START + i * OBS_STEP)
+        return {
+            "@iot.id": dsid * self.nobservations + i,
+            "phenomenonTime": t,
+            "resultTime": t,
+            "result": 100 + ((dsid * 31 + i * 7) % 1000) / 10,
+        }
+
+    # request handling
+    def count(self, key):
+        with self._lock:
+            self.requests[key] += 1
+
+    def count_authorized(self):
+        # kept out of requests so /stats only counts each request once
+        with self._lock:
+            self.authorized += 1
+
+    def handle(self, path, params):
+        with self._lock:
+            self.inflight += 1
+            inflight = self.inflight
+            error = self.error_rate and self._rng.random() < self.error_rate
+        try:
+            if self.capacity and inflight > self.capacity:
+                self.count("429")
+                return 429, {"message": "too many requests"}
+            if error:
+                self.count("503")
+                return 503, {"message": "unavailable"}
+            return self._handle(path, params)
+        finally:
+            with self._lock:
+                self.inflight -= 1
+
+    def _handle(self, path, params):
+        if self.latency:
+            time.sleep(self.latency)
+
+        if not path.startswith(ROOT):
+            return 404, {"message": "not found"}
+
+        parts = [p for p in path[len(ROOT) :].split("/") if p]
+        segments = []
+        for p in parts:
+            m = ENTITY_RE.match(p)
+            if not m:
+                return 404, {"message": f"invalid path {path}"}
+            segments.append((m.group("entity"), m.group("id")))
+
+        self.count("/".join(e for e, _ in segments))
+
+        top = int(params.get("$top", self.page_size))
+        top = min(top, self.page_size)
+        skip = int(params.get("$skip", 0))
+        orderby = params.get("$orderby", "id asc")
+        clauses = parse_filter(params.get("$filter"))
+        expand = params.get("$expand")
+
+        entity, eid = segments[-1]
+        if entity == "Locations" and len(segments) == 1:
+            values = self.query_locations(clauses)
+            total = len(values)
+            if orderby.endswith("desc"):
+                values = values[::-1]
+            values = [
+                self.expand_location(v, expand) for v in values[skip : skip + top]
+            ]
+        elif entity == "Things":
+            lid = int(segments[0][1])
+            values = [self.thing(lid)]
+            values = [t for t in values if match_name(t, clauses)]
+            total = len(values)
+        elif entity == "Datastreams" and len(segments) == 2:
+            tid = int(segments[0][1])
+            values = [self.datastream(tid, i) for i in range(len(DATASTREAMS))]
+            values = [d for d in values if match_name(d, clauses)]
+            total = len(values)
+        elif entity == "Observations":
+            dsid = int(segments[0][1])
+            values, total = self.query_observations(dsid, clauses, orderby, skip, top)
+        else:
+            return 404, {"message": f"unsupported path {path}"}
+
+        payload = {"value": values}
+        if params.get("$count") == "true":
+            payload["@iot.count"] = total
+        if skip + top < total:
+            payload["@iot.nextLink"] = self.next_link(path, params, skip + top, top)
+        return 200, payload
+
+    def next_link(self, path, params, skip, top):
+        params = dict(params)
+        params["$skip"] = skip
+        params["$top"] = top
+        params.pop("$count", None)
+        query = "&".join(f"{k}={v}" for k, v in params.items())
+        return f"{self.base_url}{path}?{query}"
+
+    def query_locations(self, clauses):
+        mask = None
+        for kind, value in clauses:
+            if kind == "within":
+                poly = shapely.wkt.loads(value)
+                shapely.prepare(poly)
+                m = shapely.contains(poly, self._points)
+                mask = m if mask is None else mask & m
+
+        locs = self.locations
+        if mask is not None:
+            locs = [loc for loc, m in zip(locs, mask) if m]
+
+        for kind, value in clauses:
+            if kind == "name":
+                locs = [loc for loc in locs if loc["name"] == value]
+            elif kind == "startswith":
+                locs = [loc for loc in locs if loc["name"].startswith(value)]
+            elif kind == "agency":
+                locs = [loc for loc in locs if loc["properties"]["agency"] == value]
+            elif kind == "description":
+                locs = [loc for loc in locs if loc["description"] == value]
+        return locs
+
+    def expand_location(self, loc, expand):
+        loc = dict(loc)
+        loc["@iot.selfLink"] = f"{self.base_url}{ROOT}/Locations({loc['@iot.id']})"
+        if not expand:
+            return loc
+
+        parts = expand.split("/")
+        m = EXPAND_RE.match(parts[0])
+        if not m or m.group("name") != "Things":
+            return loc
+
+        things = [self.thing(loc["@iot.id"])]
+        if m.group("v") is not None:
+            things = [t for t in things if t["name"] == m.group("v")]
+
+        if len(parts) > 1:
+            m = EXPAND_RE.match(parts[1])
+            if m and m.group("name") == "Datastreams":
+                for t in things:
+                    dss = [
+                        self.datastream(t["@iot.id"], i)
+                        for i in range(len(DATASTREAMS))
+                    ]
+                    if m.group("v") is not None:
+                        dss = [d for d in dss if d["name"] == m.group("v")]
+                    t["Datastreams"] = dss
+
+        loc["Things"] = things
+        return loc
+
+    def query_observations(self, dsid, clauses, orderby, skip, top):
+        start = 0
+        for kind, value in clauses:
+            if kind == "ptime_gt":
+                t = parse_timestamp(value)
+                start = max(start, int((t - OBS_START) / OBS_STEP) + 1)
+
+        indices = range(start, self.nobservations)
+        if "desc" in orderby:
+            indices = indices[::-1]
+
+        total = len(indices)
+        values = [self.observation(dsid, i) for i in indices[skip : skip + top]]
+        return values, total
+
+
+def parse_filter(f):
+    clauses = []
+    if f:
+        for part in f.split(" and "):
+            part = part.strip()
+            for kind, regex in CLAUSES:
+                m = regex.match(part)
+                if m:
+                    clauses.append((kind, m.group("v")))
+                    break
+    return clauses
+
+
+def match_name(entity, clauses):
+    return all(entity["name"] == v for kind, v in clauses if kind == "name")
+
+
+class FakeSTAHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    sta = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/stats":
+            status, payload = 200, dict(self.sta.requests)
+        else:
+            params = {k: v[0] for k, v in parse_qs(url.query).items()}
+            if "Authorization" in self.headers:
+                self.sta.count_authorized()
+            status, payload = self.sta.handle(url.path, params)
+
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+class FakeSTAServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # clients closing keep-alive connections, e.g. after a retried response
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def serve(sta, host="127.0.0.1", port=0):
+    """
+    start a server for sta in a daemon thread. returns the server. the SensorThings
+    base url is server.base_url
+    """
+    handler = type("Handler", (FakeSTAHandler,), {"sta": sta})
+    server = FakeSTAServer((host, port), handler)
+    host, port = server.server_address[:2]
+    sta.base_url = f"http://{host}:{port}"
+    server.base_url = f"{sta.base_url}{ROOT}"
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1")
+@click.option("--port", default=8080)
+@click.option("--locations", default=1000)
+@click.option("--observations", default=500)
+@click.option("--page-size", default=1000)
+@click.option("--latency", default=0.0, help="Seconds added to every request")
+@click.option("--error-rate", default=0.0, help="Fraction of requests that fail")
+@click.option(
+    "--capacity",
+    default=None,
+    type=int,
+    help="Concurrent requests above which requests get a 429",
+)
+def main(host, port, locations, observations, page_size, latency, error_rate, capacity):
+    sta = FakeSTA(
+        locations,
+        observations,
+        page_size=page_size,
+        latency=latency,
+        error_rate=error_rate,
+        capacity=capacity,
+    )
+    server = serve(sta, host, port)
+    click.secho(f"serving fake SensorThings at {server.base_url}", fg="green")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
+
+# ============= EOF =============================================
@@ -0,0 +1,334 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import json
+import os
+import sqlite3
+import time
+
+import click
+import requests
+import shapely.wkb
+from shapely.geometry import shape, mapping
+from shapely.geometry.polygon import Polygon
+
+from datatool.session import get_session
+
+SCHEMA_VERSION = "1"
+DEFAULT_TTL = 30 * 24 * 3600
+
+STATES_URL = "https://reference.geoconnex.us/collections/states/items?f=json"
+STATE_URL = "https://reference.geoconnex.us/collections/states/items/{statefp}?&f=json"
+COUNTIES_URL = (
+    "https://reference.geoconnex.us/collections/counties/items?STATEFP={statefp}&f=json"
+)
+
+# json files written by earlier versions. imported into an empty cache
+LEGACY_FILES = (".sta.states.json",)
+
+
+def default_geometry_cache_path():
+    return os.path.join(os.path.expanduser("~"), ".sta.geometry.sqlite")
+
+
+def first_polygon(geom):
+    """
+    the exterior of the first polygon of a (Multi)Polygon geometry. this is the
+    polygon the within filters have always used
+    """
+    if geom.geom_type == "MultiPolygon":
+        geom = geom.geoms[0]
+    return Polygon(geom.exterior)
+
+
+class GeometryCache:
+    """
+    sqlite store of state and county boundaries from reference.geoconnex.us.
+
+    states are indexed by postal abbreviation (STUSPS) -> STATEFP and counties by
+    (STATEFP, lowercase NAME). geometries are stored as WKB so nothing is reparsed
+    from GeoJSON after the first fetch. rows older than ttl seconds are refetched;
+    if the refetch fails the stale row is used
+    """
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL, seed=True):
+        if path is None:
+            path = default_geometry_cache_path()
+        self.path = path
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path)
+        self._init_schema()
+        if seed and self.is_empty():
+            self._seed_defaults()
+
+    def _init_schema(self):
+        conn = self._conn
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+        )
+        row = conn.execute("SELECT value FROM meta WHERE key='version'").fetchone()
+        if row and row[0] != SCHEMA_VERSION:
+            conn.execute("DROP TABLE IF EXISTS states")
+            conn.execute("DROP TABLE IF EXISTS counties")
+
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS states ("
+            "stusps TEXT PRIMARY KEY, statefp TEXT, name TEXT, geometry BLOB, "
+            "fetched REAL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS counties ("
+            "statefp TEXT, key TEXT, name TEXT, geometry BLOB, fetched REAL, "
+            "PRIMARY KEY (statefp, key))"
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+            (SCHEMA_VERSION,),
+        )
+        conn.commit()
+
+    def _seed_defaults(self):
+        home = os.path.expanduser("~")
+        paths = [os.path.join(home, p) for p in LEGACY_FILES]
+        if os.path.isdir(home):
+            paths.extend(
+                os.path.join(home, p)
+                for p in sorted(os.listdir(home))
+                if p.startswith(".sta.") and p.endswith(".counties.json")
+            )
+
+        for p in paths:
+            if os.path.isfile(p):
+                try:
+                    self.seed(p)
+                except (ValueError, KeyError, TypeError):
+                    click.secho(f"Could not seed geometry cache from {p}", fg="red")
+
+    def is_empty(self):
+        (n,) = self._conn.execute("SELECT count(*) FROM states").fetchone()
+        return n == 0
+
+    def _is_stale(self, fetched):
+        return self.ttl is not None and time.time() - fetched > self.ttl
+
+    # seeding/exporting
+    def seed(self, path, fetched=None):
+        """
+        load a GeoJSON FeatureCollection of states (STUSPS, STATEFP) and/or
+        counties (STATEFP, NAME) into the cache
+        """
+        with open(path, "r") as rfile:
+            obj = json.load(rfile)
+        self._add_features(obj["features"], fetched)
+
+    def export(self, path):
+        """
+        write the cache as a GeoJSON FeatureCollection that seed() can read, e.g.
+        to copy the cache to a machine without network access
+        """
+        features = []
+        for stusps, statefp, name, geometry in self._conn.execute(
+            "SELECT stusps, statefp, name, geometry FROM states ORDER BY stusps"
+        ):
+            features.append(
+                self._feature(
+                    {"STUSPS": stusps.upper(), "STATEFP": statefp, "NAME": name},
+                    geometry,
+                )
+            )
+        for statefp, name, geometry in self._conn.execute(
+            "SELECT statefp, name, geometry FROM counties ORDER BY statefp, key"
+        ):
+            features.append(self._feature({"STATEFP": statefp, "NAME": name}, geometry))
+
+        with open(path, "w") as wfile:
+            json.dump({"type": "FeatureCollection", "features": features}, wfile)
+        return len(features)
+
+    def _feature(self, properties, geometry):
+        if geometry is not None:
+            geometry = mapping(shapely.wkb.loads(geometry))
+        return {"type": "Feature", "properties": properties, "geometry": geometry}
+
+    def _add_features(self, features, fetched=None):
+        if fetched is None:
+            fetched = time.time()
+
+        states, counties = [], []
+        for f in features:
+            props = f["properties"]
+            geometry = f.get("geometry")
+            if geometry:
+                geometry = shapely.wkb.dumps(first_polygon(shape(geometry)))
+
+            if "STUSPS" in props:
+                states.append(
+                    (
+                        props["STUSPS"].lower(),
+                        props["STATEFP"],
+                        props.get("NAME"),
+                        geometry,
+                        fetched,
+                    )
+                )
+            else:
+                counties.append(
+                    (
+                        props["STATEFP"],
+                        props["NAME"].lower(),
+                        props["NAME"],
+                        geometry,
+                        fetched,
+                    )
+                )
+
+        # keep existing geometries when a feature comes without one, e.g. a
+        # states listing that only has properties
+        self._conn.executemany(
+            "INSERT INTO states (stusps, statefp, name, geometry, fetched) "
+            "VALUES (?, ?, ?, ?, ?) ON CONFLICT(stusps) DO UPDATE SET "
+            "statefp=excluded.statefp, name=excluded.name, "
+            "geometry=coalesce(excluded.geometry, states.geometry), "
+            "fetched=excluded.fetched",
+            states,
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO counties (statefp, key, name, geometry, fetched) "
+            "VALUES (?, ?, ?, ?, ?)",
+            counties,
+        )
+        self._conn.commit()
+
+    # fetching
+    def _fetch(self, url, msg):
+        click.secho(msg)
+        try:
+            resp = get_session().get(url)
+            resp.raise_for_status()
+            return resp.json()
+        except (requests.RequestException, ValueError) as e:
+            click.secho(f"Failed fetching {url}. {e}", fg="red")
+
+    def refresh_states(self):
+        obj = self._fetch(STATES_URL, "Caching states")
+        if obj:
+            self._add_features(obj["features"])
+            return True
+
+    def refresh_state(self, statefp):
+        obj = self._fetch(
+            STATE_URL.format(statefp=statefp), f"Caching state {statefp} geometry"
+        )
+        if obj:
+            self._add_features([obj])
+            return True
+
+    def refresh_counties(self, statefp):
+        obj = self._fetch(
+            COUNTIES_URL.format(statefp=statefp), f"Caching {statefp} counties"
+        )
+        if obj:
+            self._conn.execute("DELETE FROM counties WHERE statefp=?", (statefp,))
+            self._add_features(obj["features"])
+            return True
+
+    def refresh(self, state=None):
+        """
+        refetch states and the counties of state, or of every cached state
+        """
+        self.refresh_states()
+        if state:
+            statefps = [self.statefp(state)]
+        else:
+            statefps = [
+                r[0]
+                for r in self._conn.execute("SELECT DISTINCT statefp FROM counties")
+            ]
+        for statefp in statefps:
+            if statefp:
+                self.refresh_counties(statefp)
+
+    # lookups
+    def statefp(self, shortname):
+        row = self._get_state(shortname)
+        if row:
+            return row[0]
+
+    def state_polygon(self, shortname):
+        row = self._get_state(shortname)
+        if row:
+            statefp, geometry = row
+            if geometry is None and self.refresh_state(statefp):
+                statefp, geometry = self._get_state(shortname)
+
+            if geometry is not None:
+                return shapely.wkb.loads(geometry)
+
+    def county_polygon(self, state, county):
+        statefp = self.statefp(state)
+        if statefp:
+            row = self._get_county(statefp, county)
+            if row:
+                return shapely.wkb.loads(row[0])
+
+    def county_names(self, state):
+        statefp = self.statefp(state)
+        if statefp:
+            self._ensure_counties(statefp)
+            return [
+                r[0]
+                for r in self._conn.execute(
+                    "SELECT name FROM counties WHERE statefp=? ORDER BY key",
+                    (statefp,),
+                )
+            ]
+        return []
+
+    def _get_state(self, shortname):
+        sql = "SELECT statefp, geometry, fetched FROM states WHERE stusps=?"
+        key = shortname.lower()
+        row = self._conn.execute(sql, (key,)).fetchone()
+        if row is None or self._is_stale(row[2]):
+            if self.refresh_states():
+                row = self._conn.execute(sql, (key,)).fetchone()
+        if row:
+            return row[:2]
+
+    def _ensure_counties(self, statefp):
+        row = self._conn.execute(
+            "SELECT min(fetched) FROM counties WHERE statefp=?", (statefp,)
+        ).fetchone()
+        if row[0] is None or self._is_stale(row[0]):
+            self.refresh_counties(statefp)
+
+    def _get_county(self, statefp, county):
+        self._ensure_counties(statefp)
+        return self._conn.execute(
+            "SELECT geometry FROM counties WHERE statefp=? AND key=?",
+            (statefp, county.lower()),
+        ).fetchone()
+
+
+GEOMETRY_CACHE = None
+
+
+def get_geometry_cache():
+    global GEOMETRY_CACHE
+    if GEOMETRY_CACHE is None:
+        GEOMETRY_CACHE = GeometryCache()
+    return GEOMETRY_CACHE
+
+
+# ============= EOF =============================================
@@ -0,0 +1,254 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from threading import Lock
+
+from requests import RequestException, Response
+from requests.structures import CaseInsensitiveDict
+
+from datatool.throttle import AdaptiveAdapter
+
+DEFAULT_TTL = 24 * 3600
+DEFAULT_MAX_SIZE = 500 * 1024**2
+
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser("~"), ".sta.http_cache")
+
+
+class CacheMissError(RequestException):
+    pass
+
+
+class ResponseCache:
+    """
+    content addressed store of GET responses. entries are keyed by the sha256 of the
+    url (including the query) and point at a body file named by the sha256 of its
+    content, so identical pages are stored once. entries older than ttl seconds are
+    revalidated with the server using ETag/Last-Modified when available. the least
+    recently used entries are evicted once the bodies exceed max_size bytes
+    """
+
+    def __init__(self, root=None, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        if root is None:
+            root = default_cache_dir()
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(root, "index.sqlite"), check_same_thread=False
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, url TEXT, digest TEXT, headers TEXT, "
+            "stored REAL, accessed REAL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bodies (digest TEXT PRIMARY KEY, size INTEGER)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def key(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def get(self, url):
+        """
+        returns (headers, body, stale) or None
+        """
+        key = self.key(url)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest, headers, stored FROM entries WHERE key=?", (key,)
+            ).fetchone()
+            if row is None:
+                return
+
+            digest, headers, stored = row
+            try:
+                with open(self._body_path(digest), "rb") as rfile:
+                    body = rfile.read()
+            except FileNotFoundError:
+                self._conn.execute("DELETE FROM entries WHERE key=?", (key,))
+                self._conn.commit()
+                return
+
+            self._conn.execute(
+                "UPDATE entries SET accessed=? WHERE key=?", (time.time(), key)
+            )
+            self._conn.commit()
+
+        stale = self.ttl is not None and time.time() - stored > self.ttl
+        return json.loads(headers), body, stale
+
+    def put(self, url, headers, body):
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._body_path(digest)
+        now = time.time()
+        with self._lock:
+            if not os.path.isfile(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.tmp"
+                with open(tmp, "wb") as wfile:
+                    wfile.write(body)
+                os.replace(tmp, path)
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bodies (digest, size) VALUES (?, ?)",
+                (digest, len(body)),
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(key, url, digest, headers, stored, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.key(url), url, digest, json.dumps(dict(headers)), now, now),
+            )
+            self._conn.commit()
+            self._evict()
+
+    def record(self, hit):
+        """
+        count a cache hit or miss. called from the session's worker threads
+        """
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def touch(self, url):
+        """
+        mark an entry as fresh, e.g. after a 304 Not Modified
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE entries SET stored=?, accessed=? WHERE key=?",
+                (now, now, self.key(url)),
+            )
+            self._conn.commit()
+
+    def size(self):
+        (n,) = self._conn.execute(
+            "SELECT coalesce(sum(size), 0) FROM bodies"
+        ).fetchone()
+        return n
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+
+        total = self.size()
+        if total <= self.max_size:
+            return
+
+        for key, digest in self._conn.execute(
+            "SELECT key, digest FROM entries ORDER BY accessed"
+        ).fetchall():
+            self._conn.execute("DELETE FROM entries WHERE key=?", (key,))
+            (refs,) = self._conn.execute(
+                "SELECT count(*) FROM entries WHERE digest=?", (digest,)
+            ).fetchone()
+            if not refs:
+                (size,) = self._conn.execute(
+                    "SELECT size FROM bodies WHERE digest=?", (digest,)
+                ).fetchone()
+                self._conn.execute("DELETE FROM bodies WHERE digest=?", (digest,))
+                try:
+                    os.remove(self._body_path(digest))
+                except FileNotFoundError:
+                    pass
+                total -= size
+                if total <= self.max_size:
+                    break
+        self._conn.commit()
+
+
+class CachingAdapter(AdaptiveAdapter):
+    """
+    HTTPAdapter that serves GET requests from a ResponseCache. with replay=True
+    requests are only served from the cache and a miss raises CacheMissError. cache
+    misses go through AdaptiveAdapter's concurrency control and retries
+    """
+
+    def __init__(self, cache, replay=False, **kw):
+        super().__init__(**kw)
+        self.cache = cache
+        self.replay = replay
+
+    def send(self, request, **kw):
+        if request.method != "GET":
+            return super().send(request, **kw)
+
+        url = request.url
+        cached = self.cache.get(url)
+        if cached:
+            headers, body, stale = cached
+            if not stale or self.replay:
+                self.cache.record(hit=True)
+                return self._build_cached(request, headers, body)
+
+            # conditional revalidation
+            etag = headers.get("ETag")
+            modified = headers.get("Last-Modified")
+            if etag:
+                request.headers["If-None-Match"] = etag
+            if modified:
+                request.headers["If-Modified-Since"] = modified
+        elif self.replay:
+            raise CacheMissError(f"{url} is not cached", request=request)
+
+        self.cache.record(hit=False)
+        resp = super().send(request, **kw)
+        if cached and resp.status_code == 304:
+            self.cache.touch(url)
+            return self._build_cached(request, cached[0], cached[1])
+
+        if resp.status_code == 200:
+            headers = {
+                k: v
+                for k, v in resp.headers.items()
+                if k.lower() not in ("content-encoding", "content-length")
+            }
+            self.cache.put(url, headers, resp.content)
+        return resp
+
+    def _build_cached(self, request, headers, body):
+        resp = Response()
+        resp.status_code = 200
+        resp.headers = CaseInsensitiveDict(headers)
+        resp._content = body
+        resp.url = request.url
+        resp.request = request
+        resp.reason = "OK"
+        resp.connection = self
+        resp.encoding = "utf-8"
+        return resp
+
+
+# ============= EOF =============================================
@@ -0,0 +1,134 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import math
+
+import click
+
+from datatool.session import get_session
+from datatool.util import ordered_map
+
+DEFAULT_PAGE_SIZE = 1000
+
+
+def make_base_url(base_url):
+    if not base_url.startswith("http"):
+        base_url = f"https://{base_url}/FROST-Server/v1.1"
+    return base_url
+
+
+def make_page_url(base_url, entity, query, expand, orderby, top, skip, count=False):
+    params = [f"$orderby={orderby}", f"$top={top}", f"$skip={skip}"]
+    if query:
+        params.append(f"$filter={query}")
+    if expand:
+        params.append(f"$expand={expand}")
+    if count:
+        params.append("$count=true")
+    return f"{make_base_url(base_url)}/{entity}?{'&'.join(params)}"
+
+
+def get_auth(client):
+    """
+    the basic auth sta's Client sends with its requests, e.g. from ~/.sta.yaml.
+    None when no user is configured
+    """
+    connection = client._connection
+    if connection.get("user"):
+        return connection["user"], connection["pwd"]
+
+
+def get_page(url, verbose=False, auth=None):
+    if verbose:
+        click.secho(f"getting url={url}", fg="green")
+
+    resp = get_session().get(url, auth=auth)
+    if resp.status_code != 200:
+        click.secho(f"{url} status={resp.status_code}", fg="red")
+        return
+
+    return resp.json()
+
+
+def get_entities(
+    client,
+    entity="Locations",
+    query=None,
+    pages=1,
+    expand=None,
+    verbose=False,
+    workers=4,
+    page_size=DEFAULT_PAGE_SIZE,
+):
+    """
+    yield records from up to `pages` pages of entity, in order. the first page is
+    requested with $count=true and the $skip offsets of the remaining pages are
+    computed from the count so up to `workers` pages are fetched at once instead
+    of following @iot.nextLink one page at a time. falls back to following
+    nextLink when the server does not return a count
+    """
+    orderby = "id asc"
+    if pages and pages < 0:
+        pages = abs(pages)
+        orderby = "id desc"
+
+    base_url = client.base_url
+    auth = get_auth(client)
+
+    def url(skip, top, count=False):
+        return make_page_url(
+            base_url, entity, query, expand, orderby, top, skip, count=count
+        )
+
+    first = get_page(url(0, page_size, count=True), verbose, auth)
+    if not first:
+        return
+
+    values = first["value"]
+    yield from values
+    if "@iot.nextLink" not in first or (pages and pages <= 1):
+        return
+
+    # the server may cap $top below page_size
+    top = len(values)
+    total = first.get("@iot.count")
+    if total is None or not top:
+        yield from follow_next_links(first, pages, verbose, auth)
+        return
+
+    npages = math.ceil(total / top)
+    if pages:
+        npages = min(npages, pages)
+
+    skips = range(top, npages * top, top)
+    for page in ordered_map(
+        lambda s: get_page(url(s, top), verbose, auth), skips, workers
+    ):
+        if not page:
+            return
+        yield from page["value"]
+
+
+def follow_next_links(page, pages, verbose, auth=None):
+    count = 1
+    while "@iot.nextLink" in page and (not pages or count < pages):
+        page = get_page(page["@iot.nextLink"], verbose, auth)
+        if not page:
+            return
+        yield from page["value"]
+        count += 1
+
+
+# ============= EOF =============================================
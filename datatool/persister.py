@@ -13,17 +13,43 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 # ===============================================================================
+import bz2
 import csv
+import gzip
+import io
 import json
+import lzma
 import os
 import pprint
-from itertools import groupby
+import tempfile
+import time
+from collections import OrderedDict
+from array import array
+from datetime import datetime, timezone
+from itertools import chain
+from math import isnan
 
 import click
 import shapefile
 
+NAN = float("nan")
+
+# compression codecs recognized by their extension, e.g. out.csv.gz
+COMPRESSIONS = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".zst": "zstd"}
+
+# level: gzip/bz2 1-9, xz 0-9, zstd 1-22. None uses DEFAULT_LEVELS. gzip defaults
+# to 6 rather than 9 because 9 is several times slower for a few percent
+# threads: zstd only. 0 compresses in the writing thread, -1 uses one thread per core
+COMPRESSION = {"level": None, "threads": 0}
+DEFAULT_LEVELS = {"gzip": 6, "bz2": 9, "xz": 6, "zstd": 3}
+
+# records printed per second by --screen when also writing --out
+SCREEN_RATE = 10
+
 
 class ObsContainer:
+    __slots__ = ("location", "thing", "datastream", "obs")
+
     def __init__(self, location, thing, datastream, obs):
         self.location = location
         self.thing = thing
@@ -43,20 +69,32 @@ class ObsContainer:
             "result",
         )
 
+    @property
+    def nobs(self):
+        return len(self.obs)
+
+    @property
+    def latest_phenomenon_time(self):
+        return max((o["phenomenonTime"] for o in self.obs), default=None)
+
+    def iterrows(self):
+        for o in self.obs:
+            yield self._make_row(o)
+
     def torow(self):
+        return list(self.iterrows())
+
+    def _make_row(self, o):
         return [
-            [
-                self.location["name"],
-                self.location["@iot.id"],
-                self.thing["name"],
-                self.thing["@iot.id"],
-                self.datastream["name"],
-                self.datastream["@iot.id"],
-                o["phenomenonTime"],
-                o["resultTime"],
-                o["result"],
-            ]
-            for o in self.obs
+            self.location["name"],
+            self.location["@iot.id"],
+            self.thing["name"],
+            self.thing["@iot.id"],
+            self.datastream["name"],
+            self.datastream["@iot.id"],
+            o["phenomenonTime"],
+            o["resultTime"],
+            o["result"],
         ]
 
     def tojson(self):
@@ -75,65 +113,297 @@ class ObsContainer:
         return out
 
 
+class StreamingObsContainer(ObsContainer):
+    """
+    ObsContainer backed by a lazy observation iterator, e.g. the generator returned by
+    client.get_observations. rows are built as pages arrive so only one page of
+    observations is held in memory. the observations can only be consumed once
+    """
+
+    __slots__ = ("_nobs", "_latest")
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self._nobs = 0
+        self._latest = None
+
+    @property
+    def nobs(self):
+        return self._nobs
+
+    @property
+    def latest_phenomenon_time(self):
+        return self._latest
+
+    def iterrows(self):
+        for o in self.obs:
+            self._nobs += 1
+            ptime = o["phenomenonTime"]
+            if self._latest is None or ptime > self._latest:
+                self._latest = ptime
+            yield self._make_row(o)
+
+    def tojson(self):
+        self.obs = list(self.obs)
+        self._nobs = len(self.obs)
+        self._latest = super().latest_phenomenon_time
+        return super().tojson()
+
+
+class CompactObsContainer(ObsContainer):
+    """
+    ObsContainer that packs observations into arrays instead of keeping the full
+    SensorThings payloads. phenomenonTime/resultTime are stored as epoch seconds and
+    result as float64, roughly 24 bytes per observation. only the phenomenonTime,
+    resultTime and result of each observation are kept.
+
+    values that would not come back unchanged, e.g. times that are not formatted the
+    way FROST formats them, interval phenomenonTimes, integer, string or
+    non-numeric results, are also kept as is so the rows are identical to an
+    ObsContainer's
+    """
+
+    __slots__ = ("_ptimes", "_rtimes", "_results", "_raw")
+
+    def __init__(self, location, thing, datastream, obs):
+        self.location = location
+        self.thing = thing
+        self.datastream = datastream
+
+        self._ptimes = array("d")
+        self._rtimes = array("d")
+        self._results = array("d")
+        # original values that don't survive packing, keyed by index. rare for
+        # FROST responses
+        self._raw = {}
+        for o in obs:
+            raw = {}
+            self._ptimes.append(pack_time(o["phenomenonTime"], "phenomenonTime", raw))
+            self._rtimes.append(pack_time(o.get("resultTime"), "resultTime", raw))
+            self._results.append(pack_result(o.get("result"), raw))
+            if raw:
+                self._raw[len(self._ptimes) - 1] = raw
+
+    @property
+    def obs(self):
+        return list(self._iterobs())
+
+    @property
+    def nobs(self):
+        return len(self._ptimes)
+
+    @property
+    def latest_phenomenon_time(self):
+        return max((o["phenomenonTime"] for o in self._iterobs()), default=None)
+
+    def iterrows(self):
+        for o in self._iterobs():
+            yield self._make_row(o)
+
+    def _iterobs(self):
+        for i, (ptime, rtime, result) in enumerate(
+            zip(self._ptimes, self._rtimes, self._results)
+        ):
+            o = {
+                "phenomenonTime": from_epoch(ptime),
+                "resultTime": from_epoch(rtime),
+                "result": None if isnan(result) else result,
+            }
+            if i in self._raw:
+                o.update(self._raw[i])
+            yield o
+
+
+def pack_time(t, key, raw):
+    """
+    t as epoch seconds. t is also added to raw if from_epoch would not return it
+    unchanged
+    """
+    try:
+        packed = to_epoch(t)
+    except (TypeError, ValueError):
+        packed = NAN
+
+    if from_epoch(packed) != t:
+        raw[key] = t
+    return packed
+
+
+def pack_result(result, raw):
+    """
+    result as a float. only float and None results are packed, anything else is
+    also added to raw
+    """
+    if result is None:
+        return NAN
+    if type(result) is float and not isnan(result):
+        return result
+
+    raw["result"] = result
+    return NAN
+
+
+def configure_compression(level=None, threads=0):
+    """
+    set the compression level and number of zstd worker threads used for compressed
+    outputs
+    """
+    COMPRESSION["level"] = level
+    COMPRESSION["threads"] = threads
+
+
+def split_compression(out):
+    """
+    split a compression extension off out. returns (path, codec), e.g.
+    ("out.csv", "gzip") for out.csv.gz. codec is None for uncompressed paths
+    """
+    base, ext = os.path.splitext(out)
+    codec = COMPRESSIONS.get(ext.lower())
+    if codec:
+        return base, codec
+    return out, None
+
+
+def output_format(out):
+    """
+    the format of out without any compression extension, e.g. ".csv" for
+    out.csv.gz
+    """
+    base, _ = split_compression(out)
+    return os.path.splitext(base)[1].lower()
+
+
+def open_output(out, mode="w"):
+    """
+    open out for writing text, compressing while writing when out ends with a
+    compression extension. mode "a" appends a new gzip member/zstd frame, which
+    decompressors read as one continuous stream
+    """
+    _, codec = split_compression(out)
+    if codec is None:
+        return open(out, mode)
+
+    level = COMPRESSION["level"]
+    if level is None:
+        level = DEFAULT_LEVELS[codec]
+
+    if codec == "gzip":
+        return gzip.open(out, f"{mode}t", compresslevel=level)
+    elif codec == "bz2":
+        return bz2.open(out, f"{mode}t", compresslevel=level)
+    elif codec == "xz":
+        return lzma.open(out, f"{mode}t", preset=level)
+
+    try:
+        import zstandard
+    except ImportError:
+        raise click.ClickException(
+            "zstandard is required for .zst output. pip install zstandard"
+        )
+
+    cctx = zstandard.ZstdCompressor(level=level, threads=COMPRESSION["threads"])
+    raw = open(out, f"{mode}b")
+    # closefd closes the underlying file when the text wrapper is closed
+    return io.TextIOWrapper(cctx.stream_writer(raw, closefd=True), encoding="utf-8")
+
+
+class ConsoleSink:
+    """
+    prints records as they pass through on their way to the file writer. at most
+    max_rate records per second are formatted and printed. the rest are only counted
+    and summarized in a progress line once per second, so a large pull is not held
+    up by terminal rendering. max_rate=None, used when the screen is the only
+    output, and names_only print every record
+    """
+
+    def __init__(self, names_only=False, max_rate=SCREEN_RATE, interval=1):
+        self.names_only = names_only
+        self.max_rate = max_rate
+        self.interval = interval
+        self.count = 0
+        self.skipped = 0
+
+    def __call__(self, records):
+        window_start = time.time()
+        shown = 0
+        for r in records:
+            self.count += 1
+            now = time.time()
+            if now - window_start >= self.interval:
+                self._summarize()
+                window_start = now
+                shown = 0
+
+            if self.names_only or self.max_rate is None or shown < self.max_rate:
+                self._show(r)
+                shown += 1
+            else:
+                self.skipped += 1
+
+            yield r
+
+        self._summarize()
+
+    def _show(self, r):
+        if self.names_only:
+            msg = r["name"]
+        else:
+            msg = f"{pprint.pformat(r)}\n"
+        click.secho(f"{self.count} -------------------", fg="yellow")
+        click.secho(msg, fg="green")
+
+    def _summarize(self):
+        if self.skipped:
+            click.secho(
+                f"... {self.skipped} records not shown, {self.count} total", fg="yellow"
+            )
+            self.skipped = 0
+
+
 def woutput(screen, out, records_generator, *args, **kw):
     if not screen and not out:
         out = "out.json"
 
-    print("screen", screen, out)
-    if screen and out:
-        records_generator = list(records_generator)
-
     names_only = kw.get("names_only", False)
     if screen or names_only:
-        for i, r in enumerate(records_generator):
-            if names_only:
-                msg = r["name"]
-            else:
-                msg = f"{pprint.pformat(r)}\n"
-            click.secho(f"{i + 1} -------------------", fg="yellow")
-            click.secho(msg, fg="green")
-
-    if out:
-        if out.endswith(".shp"):
-            func = shp_output
-        elif out.endswith(".csv"):
-            func = csv_output
-        else:
-            func = json_output
-
-        nrecords = func(out, records_generator, *args, **kw)
-        click.secho(f"wrote nrecords={nrecords} to {out}", fg="yellow")
+        # records are shown on the way to the writer instead of being collected
+        # first. only rate limited when they are also written to a file
+        max_rate = SCREEN_RATE if out else None
+        records_generator = ConsoleSink(names_only, max_rate)(records_generator)
+
+    if not out:
+        nrecords = 0
+        for _ in records_generator:
+            nrecords += 1
         return nrecords
 
+    ext = output_format(out)
+    if ext == ".shp":
+        func = shp_output
+    elif ext == ".csv":
+        func = csv_output
+    elif ext in (".parquet", ".arrow"):
+        func = arrow_output
+    elif ext == ".ndjson":
+        func = ndjson_output
+    else:
+        func = json_output
 
-def shp_output(out, records_generator, query, base_url, group=False, **kw):
-    nrecords = 0
-    if group:
+    if func in (shp_output, arrow_output) and split_compression(out)[1]:
+        raise click.ClickException(
+            f"{ext} output can not be compressed. use a .csv, .json or .ndjson "
+            f"extension"
+        )
+
+    nrecords = func(out, records_generator, *args, **kw)
+    click.secho(f"wrote nrecords={nrecords} to {out}", fg="yellow")
+    return nrecords
 
-        def key(r):
-            return r["properties"]["agency"]
-
-        records = list(records_generator)
-        for agency, records in groupby(sorted(records, key=key), key=key):
-            flag = False
-            outt, ext = os.path.splitext(out)
-            outt = f"{outt}-{agency}{ext}"
-            with shapefile.Writer(outt) as w:
-                w.field("name", "C")
-                for row in records:
-                    properties = row["properties"]
-                    if not flag:
-                        for k, v in properties.items():
-                            w.field(k, "C")
-                        flag = True
-
-                    geom = row["location"]
-                    coords = geom["coordinates"]
-                    w.point(*coords)
-                    properties["name"] = row["name"]
-                    w.record(**properties)
-                    nrecords += 1
 
+def shp_output(out, records_generator, query, base_url, group=False, max_open=64, **kw):
+    nrecords = 0
+    if group:
+        nrecords = grouped_shp_output(out, records_generator, max_open=max_open)
     else:
         with shapefile.Writer(out) as w:
             w.field("name", "C")
@@ -151,30 +421,139 @@ def shp_output(out, records_generator, query, base_url, group=False, **kw):
     return nrecords
 
 
+def grouped_shp_output(out, records_generator, max_open=64):
+    """
+    write one shapefile per agency, e.g. foo-CABQ.shp.
+
+    records are partitioned by agency as they arrive and appended to a spool file
+    per group, with at most max_open spool files open at once (least recently used
+    are closed). the fields of each group are the union of the property keys of its
+    records, so records with differing properties keep all their values. shapefile
+    fields can not be added after the first record so the shapefiles are written
+    from the spools once all records have arrived
+    """
+    nrecords = 0
+    with tempfile.TemporaryDirectory() as root:
+        handles = OrderedDict()
+        fields = {}
+
+        def get_handle(key):
+            if key in handles:
+                handles.move_to_end(key)
+                return handles[key]
+
+            if len(handles) >= max_open:
+                _, h = handles.popitem(last=False)
+                h.close()
+
+            h = open(paths[key], "a")
+            handles[key] = h
+            return h
+
+        paths = {}
+        for row in records_generator:
+            properties = row["properties"]
+            key = properties["agency"]
+            if key not in fields:
+                fields[key] = {"name": None}
+                paths[key] = os.path.join(root, f"{len(paths)}.ndjson")
+
+            # dict used as an ordered set
+            fields[key].update(dict.fromkeys(properties))
+
+            properties = dict(properties)
+            properties["name"] = row["name"]
+            h = get_handle(key)
+            h.write(json.dumps([row["location"]["coordinates"], properties]))
+            h.write("\n")
+            nrecords += 1
+
+        for h in handles.values():
+            h.close()
+
+        base, ext = os.path.splitext(out)
+        for key in sorted(fields):
+            with shapefile.Writer(f"{base}-{key}{ext}") as w:
+                for k in fields[key]:
+                    w.field(k, "C")
+
+                with open(paths[key], "r") as rfile:
+                    for line in rfile:
+                        coords, properties = json.loads(line)
+                        w.point(*coords)
+                        w.record(**properties)
+
+    return nrecords
+
+
 def json_output(out, records_generator, query, base_url, **kw):
-    records = list(records_generator)
-    if isinstance(records[0], ObsContainer):
-        records = [ri.tojson() for ri in records]
+    """
+    write the {"data": [...], "query", "base_url"} envelope, serializing each record
+    as it arrives instead of collecting the whole result set first
+    """
+    count = 0
+    with open_output(out) as wfile:
+        wfile.write('{\n  "data": [')
+        for record in records_generator:
+            if isinstance(record, ObsContainer):
+                record = record.tojson()
+
+            if count:
+                wfile.write(",")
+            txt = json.dumps(record, indent=2).replace("\n", "\n    ")
+            wfile.write(f"\n    {txt}")
+            count += 1
+
+        if count:
+            wfile.write("\n  ")
+        wfile.write("],\n")
+        wfile.write(f'  "query": {json.dumps(query)},\n')
+        wfile.write(f'  "base_url": {json.dumps(base_url)}\n')
+        wfile.write("}")
+    return count
+
+
+def ndjson_output(out, records_generator, query, base_url, **kw):
+    """
+    write one JSON record per line. each line is flushed as it is written so the
+    file can be consumed while the export is still running. compressed output is
+    not flushed per line because every flush ends a compression block
+    """
+    flush = split_compression(out)[1] is None
+    count = 0
+    with open_output(out) as wfile:
+        for record in records_generator:
+            if isinstance(record, ObsContainer):
+                record = record.tojson()
+
+            wfile.write(json.dumps(record))
+            wfile.write("\n")
+            if flush:
+                wfile.flush()
+            count += 1
+    return count
 
-    data = {"data": records, "query": query, "base_url": base_url}
-    with open(out, "w") as wfile:
-        json.dump(data, wfile, indent=2)
-    return len(records)
 
+def csv_output(out, records_generator, query, base_url, append=False, **kw):
+    if append:
+        return csv_append(out, records_generator)
 
-def csv_output(out, records_generator, query, base_url, **kw):
-    with open(out, "w") as wfile:
+    with open_output(out) as wfile:
         writer = csv.writer(wfile)
         count = 0
+        header = False
 
         for emp in records_generator:
             if isinstance(emp, ObsContainer):
-                if count == 0:
+                if not header:
                     writer.writerow(emp.header())
+                    header = True
 
-                rows = emp.torow()
-                writer.writerows(rows)
-                count += len(rows)
+                # write rows as they are built so a streaming container is never
+                # materialized
+                for row in emp.iterrows():
+                    writer.writerow(row)
+                    count += 1
             else:
                 if count == 0:
                     # Writing headers of CSV file
@@ -183,11 +562,256 @@ def csv_output(out, records_generator, query, base_url, **kw):
 
                 # Writing data of CSV file
                 writer.writerow(emp.values())
-            count += 1
+                count += 1
 
         nrecords = count
 
     return nrecords
 
 
+def csv_append(out, records_generator):
+    """
+    append the rows of each ObsContainer to out. out is closed after every
+    container, so a completed container is on disk before the next one is
+    requested, and compressed outputs get a gzip member/zstd frame per container.
+    out can be truncated back to the end of any container
+    """
+    # only write a header when starting a new file
+    header = os.path.isfile(out) and os.path.getsize(out) > 0
+    count = 0
+    for emp in records_generator:
+        with open_output(out, "a") as wfile:
+            writer = csv.writer(wfile)
+            if not header:
+                writer.writerow(emp.header())
+                header = True
+
+            for row in emp.iterrows():
+                writer.writerow(row)
+                count += 1
+
+    return count
+
+
+def parse_timestamp(t):
+    """
+    convert a SensorThings time string to a timezone aware datetime. intervals
+    (start/end) are represented by their start
+    """
+    if not t:
+        return None
+
+    t = t.split("/")[0]
+    if t.endswith("Z"):
+        t = f"{t[:-1]}+00:00"
+    return datetime.fromisoformat(t)
+
+
+def to_epoch(t):
+    t = parse_timestamp(t)
+    return NAN if t is None else t.timestamp()
+
+
+def from_epoch(t):
+    """
+    inverse of to_epoch. formats the time the way FROST does, e.g.
+    2022-07-17T13:12:29.000Z
+    """
+    if isnan(t):
+        return None
+
+    t = datetime.fromtimestamp(round(t * 1000) / 1000, timezone.utc)
+    return f"{t:%Y-%m-%dT%H:%M:%S}.{t.microsecond // 1000:03d}Z"
+
+
+OBS_FIELDS = (
+    ("location_name", "string"),
+    ("location_id", "int64"),
+    ("thing_name", "string"),
+    ("thing_id", "int64"),
+    ("datastream_name", "string"),
+    ("datastream_id", "int64"),
+    ("phenomenonTime", "timestamp"),
+    ("resultTime", "timestamp"),
+    ("result", "float64"),
+    # results that are not numbers, e.g. "dry". result is null for these
+    ("result_text", "string"),
+)
+
+LOCATION_FIELDS = (
+    ("id", "int64"),
+    ("name", "string"),
+    ("description", "string"),
+    ("longitude", "float64"),
+    ("latitude", "float64"),
+    ("agency", "string"),
+    ("properties", "string"),
+    ("selfLink", "string"),
+)
+
+
+def make_arrow_schema(fields):
+    import pyarrow as pa
+
+    types = {
+        "string": pa.string(),
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "timestamp": pa.timestamp("ms", tz="UTC"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in fields])
+
+
+def obs_arrow_row(row):
+    row = list(row)
+    row[6] = parse_timestamp(row[6])
+    row[7] = parse_timestamp(row[7])
+    result = row[8]
+    text = None
+    if result is not None:
+        try:
+            row[8] = float(result)
+        except (TypeError, ValueError):
+            row[8] = None
+            text = str(result)
+    row.append(text)
+    return row
+
+
+def location_arrow_row(record, extra):
+    coords = (record.get("location") or {}).get("coordinates") or (None, None)
+    properties = record.get("properties") or {}
+    row = [
+        record.get("@iot.id"),
+        record.get("name"),
+        record.get("description"),
+        coords[0],
+        coords[1],
+        properties.get("agency"),
+        json.dumps(properties),
+        record.get("@iot.selfLink"),
+    ]
+    # expanded entities, e.g. Things/Datastreams, are stored as json strings
+    row.extend(json.dumps(record.get(k)) if k in record else None for k in extra)
+    return row
+
+
+def arrow_output(out, records_generator, query, base_url, batch_size=10000, **kw):
+    """
+    write records to a Parquet (.parquet) or Arrow IPC (.arrow) file. rows are
+    converted to typed columns and written in record batches of at most batch_size
+    rows, so memory use does not depend on the size of the export
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise click.ClickException(
+            "pyarrow is required for .parquet/.arrow output. "
+            "pip install nmwdidatatool[arrow]"
+        )
+
+    records = iter(records_generator)
+    first = next(records, None)
+
+    if first is None or isinstance(first, ObsContainer):
+        fields = OBS_FIELDS
+
+        def rows():
+            if first is not None:
+                for r in chain((first,), records):
+                    for row in r.iterrows():
+                        yield obs_arrow_row(row)
+
+    else:
+        skip = ("@iot.id", "name", "description", "location", "properties")
+        extra = [k for k in first if k not in skip and not k.startswith("@iot.")]
+        fields = LOCATION_FIELDS + tuple((k, "string") for k in extra)
+
+        def rows():
+            for r in chain((first,), records):
+                yield location_arrow_row(r, extra)
+
+    schema = make_arrow_schema(fields)
+    if output_format(out) == ".parquet":
+        writer = pq.ParquetWriter(out, schema)
+    else:
+        writer = pa.ipc.new_file(out, schema)
+
+    def write_batch(batch):
+        columns = [
+            pa.array(column, type=field.type)
+            for column, field in zip(zip(*batch), schema)
+        ]
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+
+    nrecords = 0
+    with writer:
+        batch = []
+        for row in rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write_batch(batch)
+                nrecords += len(batch)
+                batch = []
+
+        if batch:
+            write_batch(batch)
+            nrecords += len(batch)
+
+    return nrecords
+
+
+def memory_benchmark(n=100000):
+    """
+    compare the memory used by n observations held in an ObsContainer vs a
+    CompactObsContainer
+    """
+    import tracemalloc
+    from datetime import timedelta
+
+    start = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+    def make_obs():
+        for i in range(n):
+            t = start + timedelta(hours=i)
+            t = f"{t:%Y-%m-%dT%H:%M:%S}.000Z"
+            yield {
+                "@iot.id": i,
+                "@iot.selfLink": f"https://st2.newmexicowaterdata.org/FROST-Server/v1.1/Observations({i})",
+                "phenomenonTime": t,
+                "resultTime": t,
+                "result": 100 + i * 0.01,
+                "parameters": {"DataSource": "foo", "MeasuringAgency": "bar"},
+            }
+
+    location = {"name": "loc", "@iot.id": 1}
+    thing = {"name": "Water Well", "@iot.id": 1}
+    datastream = {"name": "Groundwater Levels", "@iot.id": 1}
+
+    results = {}
+    for klass, obs in (
+        (ObsContainer, lambda: list(make_obs())),
+        (CompactObsContainer, make_obs),
+    ):
+        tracemalloc.start()
+        c = klass(location, thing, datastream, obs())
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[klass.__name__] = current
+        click.secho(
+            f"{klass.__name__:<20} n={c.nobs} "
+            f"retained={current / 1e6:0.2f}MB peak={peak / 1e6:0.2f}MB",
+            fg="green",
+        )
+        del c
+
+    ratio = results["ObsContainer"] / results["CompactObsContainer"]
+    click.secho(f"CompactObsContainer uses {ratio:0.1f}x less memory", fg="yellow")
+    return results
+
+
+if __name__ == "__main__":
+    memory_benchmark()
+
 # ============= EOF =============================================
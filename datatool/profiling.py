@@ -0,0 +1,263 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import json
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from functools import wraps
+from threading import Lock, local
+from urllib.parse import urlsplit
+
+import click
+
+ID_RE = re.compile(r"\(\d+\)")
+
+
+def peak_rss_mb():
+    """
+    peak resident memory of this process in MB or None where the resource module
+    is not available, e.g. Windows
+    """
+    try:
+        import resource
+    except ImportError:
+        return
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, KiB on Linux
+    if sys.platform == "darwin":
+        rss /= 1024
+    return rss / 1024
+
+
+class Profiler:
+    """
+    per stage wall time and call counts. stages nest and times are exclusive: while
+    a nested stage runs the enclosing stage is paused, e.g. the time csv_output
+    spends waiting for the next record is not counted as writing. stacks are per
+    thread so with --workers the summed stage times can exceed the wall time
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._patched = []
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.start = time.perf_counter()
+        self.times = defaultdict(float)
+        self.calls = Counter()
+        self.requests = Counter()
+        self.bytes = 0
+        self._local = local()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def enter(self, name):
+        now = time.perf_counter()
+        stack = self._stack()
+        if stack:
+            parent, st = stack[-1]
+            self._add(parent, now - st)
+        stack.append([name, now])
+
+    def exit(self):
+        now = time.perf_counter()
+        stack = self._stack()
+        name, st = stack.pop()
+        self._add(name, now - st, call=True)
+        if stack:
+            stack[-1][1] = now
+
+    def _add(self, name, dt, call=False):
+        with self._lock:
+            self.times[name] += dt
+            if call:
+                self.calls[name] += 1
+
+    def add_request(self, url, nbytes):
+        endpoint = ID_RE.sub("", urlsplit(url).path)
+        with self._lock:
+            self.requests[endpoint] += 1
+            self.bytes += nbytes
+
+    # wrappers
+    def wrap(self, name, func):
+        @wraps(func)
+        def wrapper(*args, **kw):
+            self.enter(name)
+            try:
+                return func(*args, **kw)
+            finally:
+                self.exit()
+
+        return wrapper
+
+    def wrap_iter(self, name, iterable):
+        """
+        time spent producing each item of iterable
+        """
+        it = iter(iterable)
+        while True:
+            self.enter(name)
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                self.exit()
+            yield item
+
+    def wrap_gen(self, name, func):
+        @wraps(func)
+        def wrapper(*args, **kw):
+            return self.wrap_iter(name, func(*args, **kw))
+
+        return wrapper
+
+    def wrap_writer(self, name, func):
+        """
+        writer functions consume the records generator so record production is
+        timed as its own "fetch" stage
+        """
+
+        @wraps(func)
+        def wrapper(out, records_generator, *args, **kw):
+            records_generator = self.wrap_iter("fetch", records_generator)
+            self.enter(name)
+            try:
+                return func(out, records_generator, *args, **kw)
+            finally:
+                self.exit()
+
+        return wrapper
+
+    def patch(self, obj, attr, wrapper):
+        original = getattr(obj, attr)
+        self._patched.append((obj, attr, original))
+        setattr(obj, attr, wrapper(original))
+
+    def instrument_session(self, session):
+        send = session.send
+
+        @wraps(send)
+        def wrapper(request, **kw):
+            self.enter("http")
+            try:
+                resp = send(request, **kw)
+            finally:
+                self.exit()
+            self.add_request(request.url, len(resp.content or b""))
+            return resp
+
+        session.send = wrapper
+
+    # reporting
+    def report(self):
+        wall = time.perf_counter() - self.start
+        return {
+            "wall": wall,
+            "stages": {
+                k: {"time": self.times[k], "calls": self.calls[k]}
+                for k in sorted(self.times, key=self.times.get, reverse=True)
+            },
+            "requests": dict(self.requests.most_common()),
+            "nrequests": sum(self.requests.values()),
+            "bytes": self.bytes,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    def print_report(self, json_path=None):
+        report = self.report()
+        click.secho("=============== Profile ===============", fg="yellow")
+        click.secho(f"wall={report['wall']:0.2f}s", fg="yellow")
+        for k, v in report["stages"].items():
+            click.secho(f"{k:<10} {v['time']:>9.3f}s calls={v['calls']}", fg="green")
+        click.secho(
+            f"requests={report['nrequests']} "
+            f"downloaded={report['bytes'] / 1024 ** 2:0.2f}MB",
+            fg="yellow",
+        )
+        for k, v in report["requests"].items():
+            click.secho(f"    {v:>6} {k}", fg="green")
+        if report["peak_rss_mb"] is not None:
+            click.secho(f"peak_rss={report['peak_rss_mb']:0.1f}MB", fg="yellow")
+
+        if json_path:
+            with open(json_path, "w") as wfile:
+                json.dump(report, wfile, indent=2)
+
+    def disable(self):
+        from datatool import session
+
+        for obj, attr, original in reversed(self._patched):
+            setattr(obj, attr, original)
+        self._patched = []
+        if self.instrument_session in session.SESSION_HOOKS:
+            session.SESSION_HOOKS.remove(self.instrument_session)
+        self.enabled = False
+
+
+PROFILER = Profiler()
+
+
+def enable_profiling():
+    """
+    instrument HTTP, JSON decoding, geometry resolution, row building and file
+    writing. the functions are wrapped at runtime so there is no overhead when
+    profiling is off
+    """
+    import requests
+
+    from datatool import cli, persister, session
+
+    p = PROFILER
+    if p.enabled:
+        p.disable()
+    p.reset()
+    p.enabled = True
+
+    p.patch(requests.models.Response, "json", lambda f: p.wrap("json", f))
+    p.patch(cli, "make_wkt", lambda f: p.wrap("geometry", f))
+    for klass in (
+        persister.ObsContainer,
+        persister.StreamingObsContainer,
+        persister.CompactObsContainer,
+    ):
+        if "iterrows" in vars(klass):
+            p.patch(klass, "iterrows", lambda f: p.wrap_gen("rows", f))
+    for name in (
+        "csv_output",
+        "json_output",
+        "ndjson_output",
+        "shp_output",
+        "arrow_output",
+    ):
+        p.patch(persister, name, lambda f: p.wrap_writer("write", f))
+
+    # sessions are built lazily so instrument them as they are created
+    session.SESSION_HOOKS.append(p.instrument_session)
+    session.configure_session(session.POOL_SIZE, session.CACHE, session.REPLAY)
+    return p
+
+
+# ============= EOF =============================================
@@ -0,0 +1,101 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import os
+from threading import Lock
+
+from requests import Session
+from sta.client import Client
+
+from datatool.httpcache import CachingAdapter
+from datatool.throttle import AdaptiveAdapter
+
+DEFAULT_POOL_SIZE = int(os.environ.get("NMWDI_HTTP_POOL_SIZE", 10))
+
+SESSION = None
+POOL_SIZE = DEFAULT_POOL_SIZE
+CACHE = None
+REPLAY = False
+# called with each new session, e.g. to instrument it for --profile
+SESSION_HOOKS = []
+_LOCK = Lock()
+
+
+def accept_encoding():
+    encodings = ["gzip", "deflate"]
+    try:
+        import brotli  # noqa: F401
+
+        encodings.append("br")
+    except ImportError:
+        pass
+    return ", ".join(encodings)
+
+
+def configure_session(pool_size=None, cache=None, replay=False):
+    """
+    set the connection pool size and optional ResponseCache used by get_session. an
+    existing session is replaced so the new settings take effect. with replay=True
+    requests are only served from the cache
+    """
+    global SESSION, POOL_SIZE, CACHE, REPLAY
+    with _LOCK:
+        if pool_size:
+            POOL_SIZE = pool_size
+        CACHE = cache
+        REPLAY = replay
+        if SESSION is not None:
+            SESSION.close()
+            SESSION = None
+
+
+def get_session():
+    """
+    process wide requests Session. connections are kept alive and pooled per host so
+    TLS handshakes are reused across all page requests and Clients. requests in
+    flight per host are limited adaptively, up to the pool size, and failed GETs
+    are retried (see datatool.throttle)
+    """
+    global SESSION
+    with _LOCK:
+        if SESSION is None:
+            session = Session()
+            kw = dict(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            if CACHE is not None:
+                adapter = CachingAdapter(CACHE, replay=REPLAY, **kw)
+            else:
+                adapter = AdaptiveAdapter(**kw)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers["Accept-Encoding"] = accept_encoding()
+            for hook in SESSION_HOOKS:
+                hook(session)
+            SESSION = session
+        return SESSION
+
+
+def make_client(base_url=None, **kw):
+    """
+    sta Client that uses the shared session instead of creating its own. the
+    NMWDI_STA_URL environment variable overrides the default base url
+    """
+    if base_url is None:
+        base_url = os.environ.get("NMWDI_STA_URL")
+    client = Client(base_url=base_url, **kw)
+    client._session = get_session()
+    return client
+
+
+# ============= EOF =============================================
@@ -0,0 +1,61 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import os
+
+import yaml
+
+# SensorThings instances queried by mlocations. each source has a name, which is
+# used as the default agency, a url and an optional extra $filter
+DEFAULT_SOURCES = [
+    {"name": "NMBGMR", "url": "st2.newmexicowaterdata.org"},
+    # {"name": "OSE", "url": "ose.newmexicowaterdata.org"},
+    {
+        "name": "USGS",
+        "url": "https://labs.waterdata.usgs.gov/sta/v1.1",
+        "filter": "Location/description eq 'Well'",
+    },
+]
+
+
+def default_sources_path():
+    return os.path.join(os.path.expanduser("~"), ".sta.sources.yaml")
+
+
+def load_sources(path=None, names=None):
+    """
+    load the source registry from a yaml file with a top level `sources` list.
+    falls back to ~/.sta.sources.yaml and then DEFAULT_SOURCES. names optionally
+    selects a subset of the sources by name
+    """
+    if path is None:
+        path = default_sources_path()
+        if not os.path.isfile(path):
+            path = None
+
+    if path:
+        with open(path, "r") as rfile:
+            obj = yaml.load(rfile, Loader=yaml.SafeLoader)
+        sources = obj["sources"]
+    else:
+        sources = DEFAULT_SOURCES
+
+    if names:
+        names = [n.lower() for n in names]
+        sources = [s for s in sources if s["name"].lower() in names]
+    return sources
+
+
+# ============= EOF =============================================
@@ -0,0 +1,243 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+"""
+adaptive per host concurrency (AIMD) and jittered retries for upstream requests.
+
+every host gets a HostController shared by all threads and the async engine. the
+number of requests allowed in flight grows while responses are healthy (doubling
+per round trip at first, then by one per round trip) and is halved on 429/5xx,
+connection errors or when latency climbs well above its long term average. GET
+requests that fail that way are retried with exponential backoff and full jitter,
+honouring Retry-After
+"""
+
+import random
+import time
+from threading import Condition, Lock
+from urllib.parse import urlsplit
+
+import click
+from requests import ConnectionError, Timeout
+from requests.exceptions import ChunkedEncodingError
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_MAX_LIMIT = 64
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30
+
+# latency is considered congested when the short term average exceeds the long term
+# average by this factor
+LATENCY_FACTOR = 2.0
+
+ENABLED = True
+MAX_RETRIES = DEFAULT_MAX_RETRIES
+CONTROLLERS = {}
+_LOCK = Lock()
+
+
+def configure_throttle(enabled=True, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    turn adaptive concurrency on/off and set the number of retries of failed GETs.
+    existing controllers are discarded
+    """
+    global ENABLED, MAX_RETRIES
+    with _LOCK:
+        ENABLED = enabled
+        MAX_RETRIES = max_retries
+        CONTROLLERS.clear()
+
+
+def get_controller(url, maximum=DEFAULT_MAX_LIMIT):
+    """
+    the HostController of url's host. the threaded session and the async engine
+    share controllers so the larger of their maximums is used
+    """
+    host = urlsplit(url).netloc
+    with _LOCK:
+        controller = CONTROLLERS.get(host)
+        if controller is None:
+            controller = CONTROLLERS[host] = HostController(host, maximum=maximum)
+        elif maximum > controller.maximum:
+            controller.maximum = maximum
+        return controller
+
+
+class HostController:
+    """
+    AIMD limit on the number of requests in flight to one host. acquire/release are
+    thread safe. the async engine uses try_acquire and waits in its event loop
+    """
+
+    def __init__(
+        self,
+        host,
+        initial=DEFAULT_INITIAL_LIMIT,
+        minimum=1,
+        maximum=DEFAULT_MAX_LIMIT,
+    ):
+        self.host = host
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(initial, maximum))
+        self.inflight = 0
+        self.slow_start = True
+
+        self.latency = None
+        self.baseline = None
+        self.last_decrease = 0
+
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+
+        self._cond = Condition()
+
+    def try_acquire(self):
+        with self._cond:
+            if ENABLED and self.inflight >= int(self.limit):
+                return False
+            self.inflight += 1
+            return True
+
+    def acquire(self):
+        with self._cond:
+            while ENABLED and self.inflight >= int(self.limit):
+                self._cond.wait()
+            self.inflight += 1
+
+    def release(self, latency=None, ok=True):
+        with self._cond:
+            self.inflight -= 1
+            if ok:
+                self._on_success(latency)
+            else:
+                self._on_failure()
+            self._cond.notify_all()
+
+    def _on_success(self, latency):
+        self.successes += 1
+        if latency is not None:
+            if self.latency is None:
+                self.latency = self.baseline = latency
+            else:
+                self.latency += 0.3 * (latency - self.latency)
+                self.baseline += 0.02 * (latency - self.baseline)
+
+            if self.latency > LATENCY_FACTOR * self.baseline:
+                self._decrease()
+                return
+
+        if self.slow_start:
+            # one per response doubles the limit every round trip
+            self.limit += 1
+        else:
+            self.limit += 1 / self.limit
+        self.limit = min(self.limit, self.maximum)
+
+    def _on_failure(self):
+        self.failures += 1
+        self._decrease()
+
+    def _decrease(self):
+        # requests that were already in flight report the same congestion. only
+        # back off once per round trip
+        now = time.time()
+        if now - self.last_decrease < (self.latency or 0):
+            return
+
+        self.last_decrease = now
+        self.slow_start = False
+        self.limit = max(self.minimum, self.limit / 2)
+        self.decreases += 1
+
+    def __repr__(self):
+        return (
+            f"{self.host} limit={self.limit:0.1f} successes={self.successes} "
+            f"failures={self.failures} decreases={self.decreases}"
+        )
+
+
+def is_retryable(method, status_code=None):
+    if method.upper() not in IDEMPOTENT_METHODS:
+        return False
+    return status_code is None or status_code in RETRY_STATUS
+
+
+def backoff_delay(attempt, retry_after=None):
+    """
+    exponential backoff with full jitter. a Retry-After header (in seconds) is a
+    lower bound
+    """
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2**attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            # an HTTP date. not worth parsing, fall back to the jittered delay
+            pass
+    return delay
+
+
+class AdaptiveAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that limits the requests in flight per host with a HostController
+    and retries idempotent requests that fail with a connection error, 429 or 5xx
+    """
+
+    def send(self, request, **kw):
+        controller = get_controller(request.url, maximum=self._pool_maxsize)
+        attempt = 0
+        while True:
+            controller.acquire()
+            st = time.time()
+            try:
+                resp = super().send(request, **kw)
+                if not kw.get("stream"):
+                    # HTTPAdapter returns once the headers arrive. read the body so
+                    # the latency and the slot cover the whole download
+                    resp.content
+            except (ConnectionError, Timeout, ChunkedEncodingError):
+                controller.release(ok=False)
+                if attempt >= MAX_RETRIES or not is_retryable(request.method):
+                    raise
+                delay = backoff_delay(attempt)
+            else:
+                failed = resp.status_code in RETRY_STATUS
+                controller.release(time.time() - st, ok=not failed)
+                if (
+                    not failed
+                    or attempt >= MAX_RETRIES
+                    or not is_retryable(request.method, resp.status_code)
+                ):
+                    return resp
+
+                delay = backoff_delay(attempt, resp.headers.get("Retry-After"))
+                resp.close()
+
+            attempt += 1
+            click.secho(
+                f"retrying {request.url} in {delay:0.1f}s ({attempt}/{MAX_RETRIES})",
+                fg="yellow",
+            )
+            time.sleep(delay)
+
+
+# ============= EOF =============================================
@@ -0,0 +1,109 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import json
+import os
+
+
+def default_watermark_path():
+    return os.path.join(os.path.expanduser("~"), ".sta.watermarks.json")
+
+
+class WatermarkStore:
+    """
+    persisted record of the latest phenomenonTime already exported for each
+    datastream. keyed by output file, SensorThings base url and datastream @iot.id,
+    so a new or deleted output gets a full export.
+
+    the size of each output file is saved with its watermarks. rows written after
+    the last save, e.g. by a run that died mid location, are truncated away by
+    restore_output before the file is appended to again
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = default_watermark_path()
+        self.path = path
+        # {abspath(out): {"size": n, "marks": {base_url: {datastream_id: time}}}}
+        self._exports = {}
+        if os.path.isfile(path):
+            with open(path, "r") as rfile:
+                obj = json.load(rfile)
+            # stores written by earlier versions were not tied to an output and
+            # are ignored
+            self._exports = obj.get("exports", {})
+
+    def _export(self, out):
+        return self._exports.setdefault(os.path.abspath(out), {"size": 0, "marks": {}})
+
+    def get(self, out, base_url, datastream_id):
+        export = self._exports.get(os.path.abspath(out))
+        if export:
+            return export["marks"].get(base_url, {}).get(str(datastream_id))
+
+    def update(self, out, base_url, datastream_id, phenomenon_time):
+        if phenomenon_time is None:
+            return
+
+        marks = self._export(out)["marks"].setdefault(base_url, {})
+        key = str(datastream_id)
+        current = marks.get(key)
+        if current is None or phenomenon_time > current:
+            marks[key] = phenomenon_time
+
+    def update_output(self, out):
+        """
+        record the current size of out. call after the rows of the datastreams
+        updated since the last save are on disk
+        """
+        self._export(out)["size"] = os.path.getsize(out)
+
+    def restore_output(self, out):
+        """
+        prepare out to be appended to. rows written after the last save are
+        truncated away and the watermarks of a missing or empty out are dropped.
+        returns the number of bytes removed. raises ValueError if out is smaller
+        than the saved size, i.e. it was replaced or edited since the last export
+        """
+        key = os.path.abspath(out)
+        export = self._exports.get(key)
+        if export is None:
+            return 0
+
+        size = os.path.getsize(out) if os.path.isfile(out) else 0
+        if not size:
+            del self._exports[key]
+            return 0
+
+        extra = size - export["size"]
+        if extra < 0:
+            raise ValueError(
+                f"{out} is smaller than when it was last exported. remove it to "
+                f"export everything again"
+            )
+        if extra:
+            os.truncate(out, export["size"])
+        return extra
+
+    def save(self):
+        # write to a temporary file and swap it in so an interrupted run never
+        # leaves a truncated store behind
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as wfile:
+            json.dump({"exports": self._exports}, wfile, indent=2)
+        os.replace(tmp, self.path)
+
+
+# ============= EOF =============================================
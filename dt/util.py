@@ -19,12 +19,12 @@ from pprint import pprint
 
 import shapely
 from shapely.geometry import Polygon
-from sta.client import Client
+from datatool.session import make_client
 
 
 def make_clt():
     url = "https://st2.newmexicowaterdata.org/FROST-Server/v1.1"
-    clt = Client(base_url=url)
+    clt = make_client(base_url=url)
     return clt
 
 
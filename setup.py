@@ -21,7 +21,7 @@ with open("README.md", "r", encoding="utf-8") as fh:
 
 setup(
     name="nmwdidatatool",
-    version="0.0.4",
+    version="0.1.0",
     author="Jake Ross",
     description="NMWDI Data Tool",
     long_description=long_description,
@@ -35,10 +35,17 @@ setup(
         "cython",
         "Click",
         "requests",
-        "shapely",
+        "shapely>=2.0",
+        "numpy",
         "pyshp",
         "pysta>=0.0.28",
+        "pyyaml",
     ],
+    extras_require={
+        "arrow": ["pyarrow"],
+        "zstd": ["zstandard"],
+        "async": ["httpx"],
+    },
     entry_points={
         "console_scripts": [
             "nmwdi = datatool.cli:cli",
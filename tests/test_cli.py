@@ -0,0 +1,231 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import csv
+import gzip
+import os
+
+import pytest
+from click.testing import CliRunner
+
+from datatool import persister
+from datatool.cli import cli
+from datatool.fakesta import FakeSTA, serve
+
+NLOCATIONS = 6
+NOBSERVATIONS = 20
+
+
+class MissingThingSTA(FakeSTA):
+    """
+    location 3 has no "Water Well" Thing
+    """
+
+    def thing(self, lid):
+        thing = super().thing(lid)
+        if lid == 3:
+            thing["name"] = "Spring"
+        return thing
+
+
+@pytest.fixture
+def sta(monkeypatch, tmp_path):
+    """
+    start a fake SensorThings server of the given class and point the cli at it
+    """
+    monkeypatch.setenv("HOME", str(tmp_path))
+    servers = []
+
+    def make(klass=FakeSTA):
+        fake = klass(nlocations=NLOCATIONS, nobservations=NOBSERVATIONS)
+        server = serve(fake)
+        servers.append(server)
+        monkeypatch.setenv("NMWDI_STA_URL", server.base_url)
+        return fake
+
+    yield make
+    for server in servers:
+        server.shutdown()
+
+
+def read_rows(path):
+    path = str(path)
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", newline="") as rfile:
+        return list(csv.reader(rfile))
+
+
+def depths(out, *args):
+    result = CliRunner().invoke(cli, ["water", "depths", "--out", str(out), *args])
+    if result.exception and not isinstance(result.exception, SystemExit):
+        raise result.exception
+    return result
+
+
+@pytest.mark.parametrize("workers", ["1", "3"])
+def test_depths_skips_location_without_thing(sta, tmp_path, workers):
+    sta(MissingThingSTA)
+    out = tmp_path / "out.csv"
+    result = depths(out, "--workers", workers)
+
+    assert result.exit_code == 0
+    assert "no 'Water Well' Thing for location=WL-00003" in result.output
+    rows = read_rows(out)[1:]
+    assert len(rows) == (NLOCATIONS - 1) * NOBSERVATIONS
+    assert {r[1] for r in rows} == {"1", "2", "4", "5", "6"}
+
+
+class Interrupt(Exception):
+    pass
+
+
+def interrupt_location(monkeypatch, n, after=5):
+    """
+    make the n-th container written raise after `after` rows
+    """
+    iterrows = persister.CompactObsContainer.iterrows
+    count = [0]
+
+    def wrapper(self):
+        count[0] += 1
+        for i, row in enumerate(iterrows(self)):
+            if count[0] == n and i == after:
+                raise Interrupt
+            yield row
+
+    monkeypatch.setattr(persister.CompactObsContainer, "iterrows", wrapper)
+
+
+@pytest.mark.parametrize("ext", [".csv", ".csv.gz"])
+def test_incremental_resume_after_interrupt(sta, tmp_path, monkeypatch, ext):
+    sta()
+    expected = tmp_path / f"expected{ext}"
+    depths(expected)
+
+    out = tmp_path / f"out{ext}"
+    with monkeypatch.context() as m:
+        interrupt_location(m, 3)
+        with pytest.raises(Interrupt):
+            depths(out, "--incremental")
+
+    # the rows of the interrupted location are not written twice
+    result = depths(out, "--incremental")
+    assert result.exit_code == 0
+    assert read_rows(out) == read_rows(expected)
+
+
+def test_incremental_appends_only_new_observations(sta, tmp_path):
+    fake = sta()
+    out = tmp_path / "out.csv"
+    depths(out, "--incremental")
+    assert len(read_rows(out)) == NLOCATIONS * NOBSERVATIONS + 1
+
+    depths(out, "--incremental")
+    assert len(read_rows(out)) == NLOCATIONS * NOBSERVATIONS + 1
+
+    fake.nobservations += 5
+    depths(out, "--incremental")
+    rows = read_rows(out)
+    assert len(rows) == NLOCATIONS * (NOBSERVATIONS + 5) + 1
+    assert len({tuple(r) for r in rows}) == len(rows)
+
+
+def test_incremental_new_output_gets_everything(sta, tmp_path):
+    sta()
+    depths(tmp_path / "out.csv", "--incremental")
+
+    other = tmp_path / "out.csv.gz"
+    depths(other, "--incremental")
+    assert len(read_rows(other)) == NLOCATIONS * NOBSERVATIONS + 1
+
+    # a deleted output is exported again in full
+    (tmp_path / "out.csv").unlink()
+    depths(tmp_path / "out.csv", "--incremental")
+    assert len(read_rows(tmp_path / "out.csv")) == NLOCATIONS * NOBSERVATIONS + 1
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_sta_yaml_credentials_are_sent(sta, tmp_path, monkeypatch, use_async):
+    fake = sta()
+    # several pages so the $skip requests are checked too
+    fake.page_size = 2
+    # credentials are only read from ~/.sta.yaml when no url is given
+    base_url = os.environ["NMWDI_STA_URL"]
+    monkeypatch.delenv("NMWDI_STA_URL")
+    (tmp_path / ".sta.yaml").write_text(
+        f"base_url: {base_url}\nuser: reader\npwd: secret\n"
+    )
+
+    args = ["locations", "--pages", "0", "--out", str(tmp_path / "out.json")]
+    if use_async:
+        args.append("--async")
+    result = CliRunner().invoke(cli, args)
+    assert result.exit_code == 0, result.output
+
+    assert fake.authorized
+    assert fake.authorized == sum(fake.requests.values())
+
+
+@pytest.mark.parametrize("option", ["--replay", "--cache"])
+def test_async_refuses_http_cache(sta, tmp_path, option):
+    fake = sta()
+    out = tmp_path / "out.json"
+    result = CliRunner().invoke(
+        cli,
+        [option, "--cache-dir", str(tmp_path / "cache"), "locations", "--async"]
+        + ["--out", str(out)],
+    )
+
+    assert result.exit_code == 1
+    assert f"{option} can not be used with --async" in result.output
+    assert not out.exists()
+    assert not sum(fake.requests.values())
+
+
+@pytest.mark.parametrize(
+    "out,args,message",
+    [
+        ("out.shp.gz", [], "can not be compressed"),
+        ("out.parquet.zst", [], "can not be compressed"),
+        ("out.json", ["--incremental"], "--incremental requires a .csv --out"),
+    ],
+)
+def test_invalid_output_fails(sta, tmp_path, out, args, message):
+    sta()
+    result = depths(tmp_path / out, *args)
+    assert result.exit_code == 1
+    assert message in result.output
+
+
+def test_mlocations_replay_miss_fails(sta, tmp_path):
+    sta()
+    sources = tmp_path / "sources.yaml"
+    sources.write_text(
+        f"sources:\n  - name: fake\n    url: {os.environ['NMWDI_STA_URL']}\n"
+    )
+    cache = str(tmp_path / "cache")
+    args = ["mlocations", "--sources", str(sources), "--out", str(tmp_path / "o.shp")]
+
+    result = CliRunner().invoke(cli, ["--replay", "--cache-dir", cache, *args])
+    assert result.exit_code == 1
+    assert "is not cached" in result.output
+
+    result = CliRunner().invoke(cli, ["--cache", "--cache-dir", cache, *args])
+    assert result.exit_code == 0, result.output
+    result = CliRunner().invoke(cli, ["--replay", "--cache-dir", cache, *args])
+    assert result.exit_code == 0, result.output
+
+
+# ============= EOF =============================================
@@ -0,0 +1,121 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import pytest
+
+from datatool.persister import (
+    CompactObsContainer,
+    ObsContainer,
+    arrow_output,
+    woutput,
+)
+
+LOCATION = {"name": "loc", "@iot.id": 1}
+THING = {"name": "Water Well", "@iot.id": 2}
+DATASTREAM = {"name": "Groundwater Levels", "@iot.id": 3}
+
+
+def make_obs(phenomenon_time, result, result_time=None):
+    return {
+        "@iot.id": 1,
+        "phenomenonTime": phenomenon_time,
+        "resultTime": result_time,
+        "result": result,
+    }
+
+
+@pytest.mark.parametrize(
+    "obs",
+    [
+        make_obs("2022-07-17T13:12:29.000Z", 12.5, "2022-07-17T13:12:29.000Z"),
+        make_obs("2022-07-17T13:12:29Z", 12.5, "2022-07-17T13:12:29Z"),
+        make_obs("2022-07-17T13:12:29.123456Z", 12.5),
+        make_obs("2022-07-17T06:12:29-07:00", 12.5, "2022-07-17T06:12:29.000-07:00"),
+        make_obs("2022-07-17T13:12:29.000Z/2022-07-18T13:12:29.000Z", 12.5),
+        make_obs("2022-07-17T13:12:29.000Z", 12),
+        make_obs("2022-07-17T13:12:29.000Z", "12.50"),
+        make_obs("2022-07-17T13:12:29.000Z", "dry"),
+        make_obs("2022-07-17T13:12:29.000Z", None),
+        make_obs("2022-07-17T13:12:29.000Z", True),
+    ],
+)
+def test_compact_rows_match(obs):
+    expected = ObsContainer(LOCATION, THING, DATASTREAM, [obs])
+    compact = CompactObsContainer(LOCATION, THING, DATASTREAM, iter([obs]))
+
+    assert compact.torow() == expected.torow()
+    assert compact.nobs == expected.nobs
+    assert compact.latest_phenomenon_time == expected.latest_phenomenon_time
+
+
+def test_compact_mixed_rows_match():
+    obs = [
+        make_obs(f"2022-07-{d:02d}T13:12:29.000Z", r, f"2022-07-{d:02d}T13:12:29Z")
+        for d, r in ((1, 10.25), (2, "dry"), (3, 11), (4, None), (5, 10.5))
+    ]
+    expected = ObsContainer(LOCATION, THING, DATASTREAM, obs)
+    compact = CompactObsContainer(LOCATION, THING, DATASTREAM, iter(obs))
+
+    assert compact.torow() == expected.torow()
+    assert [type(r[-1]) for r in compact.torow()] == [
+        type(r[-1]) for r in expected.torow()
+    ]
+    assert compact.latest_phenomenon_time == "2022-07-05T13:12:29.000Z"
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".arrow"])
+def test_arrow_output_non_numeric_results(tmp_path, ext):
+    pa = pytest.importorskip("pyarrow")
+    obs = [
+        make_obs(f"2022-07-{d:02d}T13:12:29.000Z", r)
+        for d, r in ((1, 10.25), (2, "dry"), (3, "12.50"), (4, None))
+    ]
+    out = str(tmp_path / f"out{ext}")
+    n = arrow_output(
+        out, [CompactObsContainer(LOCATION, THING, DATASTREAM, iter(obs))], None, None
+    )
+    assert n == 4
+
+    if ext == ".parquet":
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(out)
+    else:
+        table = pa.ipc.open_file(out).read_all()
+
+    assert table.column("result").to_pylist() == [10.25, None, 12.5, None]
+    assert table.column("result_text").to_pylist() == [None, "dry", None, None]
+
+
+def test_screen_only_shows_every_record(capsys):
+    records = [{"name": f"loc{i}", "@iot.id": i} for i in range(50)]
+    assert woutput(True, None, iter(records)) == 50
+
+    output = capsys.readouterr().out
+    assert all(f"'loc{i}'" in output for i in range(50))
+    assert "not shown" not in output
+
+
+def test_screen_with_out_is_rate_limited(tmp_path, capsys):
+    records = [
+        {"name": f"loc{i}", "@iot.id": i, "location": None, "properties": {}}
+        for i in range(50)
+    ]
+    out = str(tmp_path / "out.ndjson")
+    assert woutput(True, out, iter(records), None, None) == 50
+    assert "40 records not shown" in capsys.readouterr().out
+
+
+# ============= EOF =============================================
@@ -0,0 +1,39 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import pytest
+
+from datatool.util import ordered_map
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_ordered_map_order(workers):
+    assert list(ordered_map(lambda x: x * 2, iter(range(10)), workers)) == list(
+        range(0, 20, 2)
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 3])
+def test_ordered_map_stop_iteration_is_raised(workers):
+    def func(x):
+        if x == 3:
+            raise StopIteration
+        return x
+
+    with pytest.raises(RuntimeError):
+        list(ordered_map(func, range(10), workers))
+
+
+# ============= EOF =============================================
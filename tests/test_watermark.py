@@ -0,0 +1,89 @@
+# ===============================================================================
+# Copyright 2022 ross
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# ===============================================================================
+import pytest
+
+from datatool.watermark import WatermarkStore
+
+BASE_URL = "https://example.com/FROST-Server/v1.1"
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "watermarks.json")
+
+
+def export(store, out, text, ptime="2022-01-01T00:00:00.000Z"):
+    with open(out, "a") as wfile:
+        wfile.write(text)
+    store.update(out, BASE_URL, 1, ptime)
+    store.update_output(out)
+    store.save()
+
+
+def test_marks_are_saved_per_output(tmp_path, store_path):
+    out = str(tmp_path / "out.csv")
+    export(WatermarkStore(store_path), out, "a\n")
+
+    store = WatermarkStore(store_path)
+    assert store.get(out, BASE_URL, 1) == "2022-01-01T00:00:00.000Z"
+    assert store.get(str(tmp_path / "other.csv"), BASE_URL, 1) is None
+
+
+def test_update_keeps_latest(tmp_path, store_path):
+    out = str(tmp_path / "out.csv")
+    store = WatermarkStore(store_path)
+    store.update(out, BASE_URL, 1, "2022-01-02T00:00:00.000Z")
+    store.update(out, BASE_URL, 1, "2022-01-01T00:00:00.000Z")
+    assert store.get(out, BASE_URL, 1) == "2022-01-02T00:00:00.000Z"
+
+
+def test_restore_truncates_unsaved_rows(tmp_path, store_path):
+    out = str(tmp_path / "out.csv")
+    export(WatermarkStore(store_path), out, "header\nrow1\n")
+    with open(out, "a") as wfile:
+        wfile.write("partial")
+
+    store = WatermarkStore(store_path)
+    assert store.restore_output(out) == len("partial")
+    with open(out) as rfile:
+        assert rfile.read() == "header\nrow1\n"
+    assert store.get(out, BASE_URL, 1) is not None
+
+
+@pytest.mark.parametrize("empty", [True, False])
+def test_restore_drops_marks_of_missing_or_empty_output(tmp_path, store_path, empty):
+    out = tmp_path / "out.csv"
+    export(WatermarkStore(store_path), str(out), "header\nrow1\n")
+    if empty:
+        out.write_text("")
+    else:
+        out.unlink()
+
+    store = WatermarkStore(store_path)
+    assert store.restore_output(str(out)) == 0
+    assert store.get(str(out), BASE_URL, 1) is None
+
+
+def test_restore_rejects_shrunk_output(tmp_path, store_path):
+    out = tmp_path / "out.csv"
+    export(WatermarkStore(store_path), str(out), "header\nrow1\n")
+    out.write_text("x\n")
+
+    with pytest.raises(ValueError):
+        WatermarkStore(store_path).restore_output(str(out))
+
+
+# ============= EOF =============================================